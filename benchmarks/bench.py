@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the hot paths of django-sass: generating css with the sassify command (cold and
+warm), the update_needed() staleness check, and parsing and rendering the {% sass %} tag.
+
+Everything runs in a temporary directory against a sqlite database, using the fakesass script
+in place of the sass binary, so no network, sass install or project is needed:
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline results.json
+
+With --baseline, any result more than --threshold (20% by default) slower than the baseline is
+reported as a regression and the script exits with status 1.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+from multiprocessing import cpu_count
+from timeit import default_timer as timer
+
+ROOT = tempfile.mkdtemp(prefix='sass-bench-')
+FAKE_SASS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fakesass')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+settings.configure(
+    DEBUG=False,
+    INSTALLED_APPS=['sass'],
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(ROOT, 'bench.db')}},
+    MEDIA_ROOT=ROOT,
+    MEDIA_URL='/media/',
+    SASS_BIN=FAKE_SASS,
+    SASS_LOAD_PATHS=('sass/partials',),
+    SASS=(),
+    TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates'}],
+)
+
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+
+from django.core.management import call_command
+from django.template import Context, Template
+
+from sass import registry
+from sass import definitions as sass_definitions
+from sass.models import SassModel
+from sass.utils import update_needed
+from sass.management.commands import sassify
+
+
+SIZES = (1, 10, 100, 1000)
+RENDER_REPEAT = 10000
+THREADS = 8
+
+
+def create_definitions(count):
+    """
+    Writes 'count' sass files sharing a partial and points the SASS setting at them.
+    """
+    for directory in ('sass', 'sass/partials', 'css'):
+        path = os.path.join(ROOT, directory)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+    if os.path.exists(os.path.join(ROOT, 'sass-manifest.json')):
+        os.remove(os.path.join(ROOT, 'sass-manifest.json'))
+    with open(os.path.join(ROOT, 'sass/partials/_shared.scss'), 'w') as fd:
+        fd.write('$color: #333;\n')
+    definitions = []
+    for i in range(count):
+        with open(os.path.join(ROOT, 'sass/page%d.scss' % i), 'w') as fd:
+            fd.write('@import "shared";\n.page%d { color: $color; }\n' % i)
+        definitions.append({'name': 'page%d' % i, 'details': {'input': 'sass/page%d.scss' % i, 'output': 'css/page%d.css' % i}})
+    settings.SASS = tuple(definitions)
+    sass_definitions.reset()
+    SassModel.objects.all().delete()
+
+
+def measure(function, repeat=1):
+    # returns the seconds taken per call.
+    start = timer()
+    for i in range(repeat):
+        function()
+    return (timer() - start) / repeat
+
+
+def bench_sassify(results, sizes):
+    for count in sizes:
+        create_definitions(count)
+        command = sassify.Command()
+        jobs = cpu_count()
+        results['sassify.cold.%d' % count] = measure(lambda: command.process_sass(jobs=jobs))
+        results['sassify.warm.%d' % count] = measure(lambda: sassify.Command().process_sass(jobs=jobs))
+
+        sass_objs = list(SassModel.objects.all())
+        def check_all():
+            for sass_obj in sass_objs:
+                update_needed(sass_obj, sass_obj)
+        results['update_needed.%d' % count] = measure(check_all) / count
+
+
+def bench_tag(results):
+    create_definitions(10)
+    sassify.Command().process_sass()
+    registry.load()
+    source = "{% load sass_tag %}{% sass 'page0' %}"
+    results['tag.parse'] = measure(lambda: Template(source), repeat=1000)
+
+    template = Template(source)
+    context = Context()
+    results['tag.render'] = measure(lambda: template.render(context), repeat=RENDER_REPEAT)
+
+    def render_many():
+        for i in range(RENDER_REPEAT // THREADS):
+            template.render(Context())
+    def render_threaded():
+        threads = [threading.Thread(target=render_many) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    results['tag.render.threads'] = measure(render_threaded) / RENDER_REPEAT
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns a line for each result slower than its baseline by more than the threshold.
+    """
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        before = baseline.get(name)
+        if before and seconds > before * (1 + threshold):
+            regressions.append('%s: %.6fs -> %.6fs (+%.0f%%)' % (name, before, seconds, (seconds / before - 1) * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark django-sass.')
+    parser.add_argument('--output', help='Write the results to this json file.')
+    parser.add_argument('--baseline', help='Compare the results with this json file.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown over the baseline reported as a regression.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES), help='Numbers of definitions to build.')
+    args = parser.parse_args()
+
+    try:
+        call_command('migrate', run_syncdb=True, verbosity=0)
+        results = {}
+        bench_sassify(results, [int(size) for size in args.sizes.split(',')])
+        bench_tag(results)
+    finally:
+        shutil.rmtree(ROOT)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            fd.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            regressions = compare(results, json.load(fd), args.threshold)
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
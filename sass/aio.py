@@ -0,0 +1,130 @@
+"""
+Asynchronous versions of the sassify command and the freshness check of the {% sass %} tag,
+for ASGI sites. Sass is run with asyncio subprocesses, and the database and the files are
+touched through sync_to_async, so checking and generating css never blocks the event loop.
+
+    from sass.aio import acompile, aensure_fresh
+
+    await acompile('site')
+    await aensure_fresh(['site', 'print'])
+
+This module needs python 3.8 or later and asgiref, which is installed with the 'async' extra:
+
+    pip install django-sass[async]
+"""
+import time
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from multiprocessing import cpu_count
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from sass import registry
+from sass.locks import SASS_DB_LOCK, build_lock
+from sass.compilers import SubprocessCompiler
+from sass.templatetags.sass_tag import check_due
+from sass.management.commands import sassify
+
+
+# the most sass processes run at once by each event loop.
+SASS_ASYNC_CONCURRENCY = getattr(settings, 'SASS_ASYNC_CONCURRENCY', cpu_count())
+# how often a build waiting for another process to finish checks the lock.
+LOCK_POLL_INTERVAL = 0.1
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_semaphore():
+    # semaphores belong to the loop they were created in.
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(SASS_ASYNC_CONCURRENCY)
+    return _semaphores[loop]
+
+
+@asynccontextmanager
+async def abuild_lock(wait=True):
+    """
+    Holds the build lock like build_lock(), but waits for it without blocking the loop.
+    """
+    while True:
+        with build_lock(wait=False) as locked:
+            if locked or not wait:
+                yield locked
+                return
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+
+async def acompile_pairs(compiler, pairs, style, load_paths):
+    """
+    Generates the css for each (input, output) pair like compiler.compile(). The sass binary
+    is run as an asyncio subprocess; other backends are run in a thread.
+    """
+    if not isinstance(compiler, SubprocessCompiler):
+        return await sync_to_async(compiler.compile, thread_sensitive=False)(pairs, style, load_paths)
+    start = time.time()
+    process = await asyncio.create_subprocess_exec(*compiler.get_args(pairs, style, load_paths), stderr=asyncio.subprocess.PIPE)
+    startup_time = time.time() - start
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        return stderr.decode('utf-8', 'replace').strip(), startup_time
+    return None, startup_time
+
+
+async def arun_compiler(command, sass_objs):
+    pairs = command.get_pairs(sass_objs)
+    async with get_semaphore():
+        start = time.time()
+        error, startup_time = await acompile_pairs(command.compiler, pairs, sass_objs[0].style, command.graph.load_paths)
+        elapsed = time.time() - start
+    # post-processing, hashing and renaming the css is done in a thread, off the loop.
+    return await sync_to_async(command.store_output, thread_sensitive=False)(sass_objs, pairs, error, elapsed, startup_time)
+
+
+async def arun_batch(command, sass_objs):
+    # the same as Command.run_batch().
+    if command.can_batch(sass_objs):
+        error = await arun_compiler(command, sass_objs)
+        if error is None:
+            return [(sass_obj, None) for sass_obj in sass_objs]
+    return [(sass_obj, await arun_compiler(command, [sass_obj])) for sass_obj in sass_objs]
+
+
+async def acompile(names=None, force=False, wait=True):
+    """
+    Generates the css for the named definitions (or all of them) which are out of date, like
+    the sassify command. Returns a list of (name, seconds taken) for the css generated. With
+    wait=False nothing is generated if another process is already generating css.
+    """
+    if isinstance(names, str):
+        names = [names]
+    command = sassify.Command()
+    if SASS_DB_LOCK:
+        # the rows are locked by a transaction, which can't be held across awaits.
+        return await sync_to_async(command.process_sass, thread_sensitive=False)(force=force, names=names, wait=wait)
+    async with abuild_lock(wait) as locked:
+        if not locked:
+            return []
+        stale = await sync_to_async(command.get_stale_models)(names, force)
+        restored, sass_objs = await sync_to_async(command.prepare)(stale)
+        batches = command.get_batches(sass_objs, SASS_ASYNC_CONCURRENCY)
+        results = await asyncio.gather(*[arun_batch(command, batch) for batch in batches])
+        timings = await sync_to_async(command.finish)(restored, results, SASS_ASYNC_CONCURRENCY)
+        await sync_to_async(command.build_bundles)(names)
+        return timings
+
+
+async def aensure_fresh(names):
+    """
+    The asynchronous version of the tag's debug check - generates the css of the named sass
+    which is out of date, unless it was checked less than SASS_CHECK_INTERVAL seconds ago, and
+    reloads the links.
+    """
+    if isinstance(names, str):
+        names = [names]
+    due = [name for name in names if check_due(name)]
+    if due:
+        await acompile(due, wait=False)
+        await sync_to_async(registry.load)()
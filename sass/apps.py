@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class SassConfig(AppConfig):
+    name = 'sass'
+    verbose_name = 'Sass'
+
+    def ready(self):
+        from django.test.signals import setting_changed
+        from sass import definitions, registry
+
+        # parse the SASS setting now, so mistakes in it are found at startup.
+        definitions.load()
+        registry.load()
+        setting_changed.connect(definitions.reset)
+        setting_changed.connect(registry.reset)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import hashlib
+
+from sass.models import fingerprinted_path, output_files
+from sass.utils import atomic_copy, temporary_path
+from sass.storage import upload_files
+from sass.compression import SASS_BROTLI, SASS_GZIP, COMPRESSION_EXTENSIONS, compress_file
+
+
+def bundle_digest(bundle, sass_objs):
+    """
+    Returns a hash of the css of the bundle's members, or None if any of them has never been
+    generated. It changes whenever the css of a member does.
+    """
+    hashes = [sass_objs[member].css_hash if member in sass_objs else '' for member in bundle.members]
+    if not all(hashes):
+        return None
+    return hashlib.md5('\n'.join(hashes).encode('utf-8')).hexdigest()
+
+
+def build_bundle(bundle, sass_objs, storage=None):
+    """
+    Joins the css of the bundle's members into its output file and a fingerprinted copy, unless
+    the fingerprinted copy for their current css exists already. New files are saved to the
+    storage, if given. Returns the url of the fingerprinted copy, or None if a member hasn't
+    been generated.
+    """
+    digest = bundle_digest(bundle, sass_objs)
+    if digest is None:
+        return None
+    path = fingerprinted_path(bundle.output_file, digest)
+    if not os.path.exists(path):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        tmp = temporary_path(path)
+        with open(tmp, 'wb') as fd:
+            for member in bundle.members:
+                with open(sass_objs[member].css_path, 'rb') as css:
+                    shutil.copyfileobj(css, fd)
+                fd.write(b'\n')
+        os.rename(tmp, path)
+        if SASS_GZIP or SASS_BROTLI:
+            compress_file(path)
+        written = []
+        for source in [path] + [path + ext for ext in COMPRESSION_EXTENSIONS]:
+            if os.path.exists(source):
+                atomic_copy(source, source.replace(path, bundle.output_file, 1))
+                written += [source, source.replace(path, bundle.output_file, 1)]
+        if storage is not None:
+            upload_files(storage, written)
+    return fingerprinted_path(bundle.media_url, digest)
+
+
+def bundle_files(bundle):
+    """
+    Returns the paths of every file generated for the bundle which currently exists.
+    """
+    return output_files(bundle.output_file)
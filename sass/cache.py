@@ -0,0 +1,96 @@
+import os
+import hashlib
+
+from django.conf import settings
+
+from sass.models import SASS_ROOT
+from sass.utils import atomic_copy, hash_files
+
+
+# a directory of generated css, keyed by everything that goes into it, which can be shared by
+# every checkout and build host. It is trimmed back to SASS_CACHE_SIZE bytes after each build,
+# dropping the least recently used css first.
+SASS_CACHE_DIR = getattr(settings, 'SASS_CACHE_DIR', None)
+SASS_CACHE_SIZE = getattr(settings, 'SASS_CACHE_SIZE', 100 * 1024 * 1024)
+
+
+class CompileCache(object):
+
+    def __init__(self, directory, max_size=SASS_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, input_file, dependencies, style, version, digests=None):
+        """
+        Returns the key for css generated from the sass file: a hash of the contents of the
+        file and everything it imports, the output style and the compiler version. Paths are
+        taken relative to SASS_ROOT so checkouts in different places share keys. Callers
+        working out many keys should hash the files once and pass the digests in.
+        """
+        paths = [input_file] + list(dependencies)
+        if digests is None:
+            digests = hash_files(paths)
+        md5 = hashlib.md5()
+        md5.update(('%s\n%s\n' % (style, version)).encode('utf-8'))
+        for path in paths:
+            md5.update(('%s %s\n' % (os.path.relpath(path, SASS_ROOT), digests[path])).encode('utf-8'))
+        return md5.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.css')
+
+    def get(self, key, destination):
+        """
+        Copies the cached css for the key to the destination. Returns False if there isn't any.
+        """
+        path = self.path(key)
+        try:
+            atomic_copy(path, destination)
+        except (IOError, OSError):
+            return False
+        # the modified time of an entry records when it was last used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key, source):
+        path = self.path(key)
+        if not os.path.exists(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                # another build created it first.
+                pass
+        atomic_copy(source, path)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is no larger than max_size.
+        """
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        while total > self.max_size and entries:
+            mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def get_cache():
+    if SASS_CACHE_DIR:
+        return CompileCache(SASS_CACHE_DIR)
+    return None
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import atexit
+import threading
+import subprocess
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from sass.exceptions import SassConfigurationError
+
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'worker.rb')
+
+
+class BaseCompiler(object):
+    """
+    A compiler backend generates css files from sass files. Backends which can generate many
+    files in one call should set supports_batch so the sassify command groups files for them.
+    """
+    supports_batch = False
+
+    def version(self):
+        """
+        Returns a string identifying the compiler and its version. Css cached from a different
+        version is not reused, so it shouldn't include anything which differs between hosts
+        running the same version - such as where it is installed.
+        """
+        return self.__class__.__name__
+
+    def compile(self, pairs, style, load_paths):
+        """
+        Generates the css for each (input, output) pair. Returns the error output of the
+        compiler (None on success) and the seconds spent starting the compiler.
+        """
+        raise NotImplementedError
+
+
+class SubprocessCompiler(BaseCompiler):
+    """
+    Runs the SASS_BIN executable for every call.
+    """
+    supports_batch = True
+
+    def __init__(self):
+        self.bin = getattr(settings, "SASS_BIN", None)
+        if not self.bin:
+            raise SassConfigurationError('SASS_BIN is not defined in settings.py file.')
+        # test that the binary actually exists.
+        if not os.path.exists(self.bin):
+            raise SassConfigurationError('Sass binary defined by SASS_BIN does not exist: %s' % self.bin)
+        self._version = None
+
+    def version(self):
+        if self._version is None:
+            try:
+                p = subprocess.Popen([self.bin, "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                stdout, stderr = p.communicate()
+                self._version = stdout.decode('utf-8', 'replace').strip()
+            except OSError:
+                self._version = ''
+        return self._version
+
+    def get_args(self, pairs, style, load_paths):
+        # sass writes a source map next to its output by default, which would be left behind
+        # by the temporary file the css is written to.
+        args = [self.bin, "-t", style, "--no-cache", "--sourcemap=none"]
+        for load_path in load_paths:
+            args.extend(["-I", load_path])
+        if len(pairs) == 1:
+            args.extend(pairs[0])
+        else:
+            args.extend(["--update", "--force"])
+            args.extend("%s:%s" % pair for pair in pairs)
+        return args
+
+    def compile(self, pairs, style, load_paths):
+        args = self.get_args(pairs, style, load_paths)
+        start = time.time()
+        p = subprocess.Popen(args, stderr=subprocess.PIPE)
+        startup_time = time.time() - start
+        stdout, stderr = p.communicate()
+        if p.returncode != 0: # Process failed (nonzero exit code)
+            return stderr.decode('utf-8', 'replace').strip(), startup_time
+        return None, startup_time
+
+
+class PersistentCompiler(BaseCompiler):
+    """
+    Keeps a single sass worker process alive and sends it one job per line over stdin, so
+    only the first compile pays for starting sass. The worker answers each job with a line of
+    json holding the error, if any, and a {"version": true} job with the version of its sass
+    as {"version": "..."}. SASS_WORKER is the command that starts the worker and
+    defaults to the Ruby Sass worker shipped with this app.
+    """
+
+    def __init__(self):
+        self.command = getattr(settings, "SASS_WORKER", None) or ['ruby', WORKER_SCRIPT]
+        self.lock = threading.Lock()
+        self.process = None
+        self._version = None
+        atexit.register(self.close)
+
+    def version(self):
+        if self._version is None:
+            with self.lock:
+                reply = self.request({'version': True})
+            self._version = reply and reply.get('version') or ''
+        return self._version
+
+    def get_process(self):
+        if self.process is None or self.process.poll() is not None:
+            try:
+                self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            except OSError as e:
+                raise SassConfigurationError('Unable to start the sass worker %s: %s' % (self.command, e))
+        return self.process
+
+    def request(self, job):
+        """
+        Sends the job to the worker and returns its answer, or None if the worker died. Called
+        with the lock held.
+        """
+        process = self.get_process()
+        try:
+            process.stdin.write((json.dumps(job) + '\n').encode('utf-8'))
+            process.stdin.flush()
+            line = process.stdout.readline()
+        except (IOError, OSError):
+            line = None
+        if not line:
+            # the worker died - it will be restarted for the next job.
+            self.close()
+            return None
+        return json.loads(line.decode('utf-8'))
+
+    def compile(self, pairs, style, load_paths):
+        errors = []
+        startup_time = 0
+        with self.lock:
+            for input_file, output_file in pairs:
+                job = {'input': input_file, 'output': output_file, 'style': style, 'load_paths': list(load_paths)}
+                start = time.time()
+                self.get_process()
+                startup_time += time.time() - start
+                reply = self.request(job)
+                if reply is None:
+                    errors.append('The sass worker exited unexpectedly.')
+                elif reply.get('error'):
+                    errors.append(reply['error'])
+        return '\n'.join(errors) or None, startup_time
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process = None
+
+
+_compiler = None
+
+def get_compiler():
+    """
+    Returns the compiler backend named by the SASS_COMPILER setting. The instance is kept for
+    the life of the process, so persistent backends are shared by everything using it.
+    """
+    global _compiler
+    if _compiler is None:
+        path = getattr(settings, "SASS_COMPILER", 'sass.compilers.SubprocessCompiler')
+        try:
+            compiler_class = import_string(path)
+        except ImportError:
+            raise SassConfigurationError('SASS_COMPILER could not be imported: %s' % path)
+        _compiler = compiler_class()
+    return _compiler
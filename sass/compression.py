@@ -0,0 +1,79 @@
+import io
+import os
+import gzip
+
+from django.conf import settings
+
+from sass.exceptions import SassConfigurationError
+from sass.utils import temporary_path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# write precompressed copies of the css (test.css.gz, test.css.br) for servers that can send
+# them as is, eg. nginx's gzip_static.
+SASS_GZIP = getattr(settings, 'SASS_GZIP', False)
+SASS_BROTLI = getattr(settings, 'SASS_BROTLI', False)
+
+COMPRESSION_EXTENSIONS = ('.gz', '.br')
+CHUNK_SIZE = 64 * 1024
+
+
+def compress_file(path):
+    """
+    Writes the enabled compressed copies of the file next to it, at maximum compression.
+    Returns the sizes of the gzip and brotli copies, None for those not enabled.
+    """
+    gzip_size = brotli_size = None
+    if SASS_GZIP:
+        gzip_size = write_compressed(path, '.gz', GzipCompressor())
+    if SASS_BROTLI:
+        if brotli is None:
+            raise SassConfigurationError('SASS_BROTLI is enabled but the brotli module is not installed.')
+        brotli_size = write_compressed(path, '.br', brotli.Compressor(quality=11))
+    return gzip_size, brotli_size
+
+
+def write_compressed(path, extension, compressor):
+    destination = path + extension
+    tmp = temporary_path(destination)
+    size = 0
+    with open(path, 'rb') as source:
+        with open(tmp, 'wb') as fd:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                data = compressor.process(chunk)
+                fd.write(data)
+                size += len(data)
+            data = compressor.finish()
+            fd.write(data)
+            size += len(data)
+    os.rename(tmp, destination)
+    return size
+
+
+class GzipCompressor(object):
+    """
+    Gives gzip the same process/finish interface as brotli.Compressor. The timestamp is left
+    out of the header so the same css always compresses to the same bytes.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.file = gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=self.buffer, mtime=0)
+
+    def process(self, data):
+        self.file.write(data)
+        return self.read()
+
+    def finish(self):
+        self.file.close()
+        return self.read()
+
+    def read(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
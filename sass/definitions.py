@@ -0,0 +1,226 @@
+import os
+import threading
+from collections import namedtuple, OrderedDict
+
+from django.conf import settings
+from django.utils.http import urlquote
+
+from sass.models import SASS_ROOT, SASS_URL, SassModel
+from sass.discovery import Discovery
+from sass.exceptions import SassConfigurationError
+
+
+class SassDefinition(namedtuple('SassDefinition', 'name input_file output_file media_url')):
+    """
+    A validated entry of the SASS setting, with its paths resolved against SASS_ROOT and the
+    url of its css worked out in advance.
+    """
+    __slots__ = ()
+
+
+class SassBundle(namedtuple('SassBundle', 'name members output_file media_url')):
+    """
+    A validated entry of the SASS_BUNDLES setting - the css of its member definitions joined,
+    in order, into a single file.
+    """
+    __slots__ = ()
+
+
+_lock = threading.Lock()
+_definitions = None
+_bundles = None
+_directories = []
+
+
+def get_details(sass_def, properties):
+    """
+    Returns the name of an entry of the SASS setting and the values of the named properties
+    of its details, raising a SassConfigurationError saying what is missing if any are.
+    """
+    try:
+        name = sass_def.get('name')
+        details = sass_def.get('details') or {}
+        values = [details.get(prop) for prop in properties]
+    except AttributeError:
+        raise SassConfigurationError('Sass definitions must be dictionaries:\n%s\n' % (sass_def,))
+
+    # i hate generic exception message - try to give the user a meaningful message about what exactly the problem is.
+    for prop in [('name', name), ('details', details)] + list(zip(properties, values)):
+        if not prop[1]:
+            raise SassConfigurationError('Sass \'%s\' property not defined in configuration:\n%s\n' % (prop[0], sass_def))
+    return [name] + values
+
+
+def make_definition(name, sass_input, sass_output, url=None):
+    max_length = SassModel._meta.get_field('name').max_length
+    if len(name) > max_length:
+        raise SassConfigurationError('Sass name is longer than %d characters: %s\n' % (max_length, name))
+
+    output_file, media_url = get_output(sass_output, url)
+    return SassDefinition(
+        name=name,
+        input_file=os.path.join(SASS_ROOT, sass_input),
+        output_file=output_file,
+        media_url=media_url,
+    )
+
+
+def get_output(sass_output, url=None):
+    # returns the path of an output in the settings and the url it is served from. There is
+    # no url for css generated outside SASS_ROOT unless one is given.
+    output_file = os.path.normpath(os.path.join(SASS_ROOT, sass_output))
+    if url:
+        return output_file, url
+    if not output_file.startswith(os.path.join(SASS_ROOT, '')):
+        raise SassConfigurationError('Sass output is outside SASS_ROOT and has no url: %s\n' % sass_output)
+    return output_file, SASS_URL + urlquote(os.path.relpath(output_file, SASS_ROOT))
+
+
+def parse_definition(sass_def):
+    """
+    Returns the SassDefinition for an entry of the SASS setting, raising a
+    SassConfigurationError saying what is wrong with it if it isn't valid.
+    """
+    return make_definition(*get_details(sass_def, ['input', 'output']), url=sass_def['details'].get('url'))
+
+
+def parse_directory_definition(sass_def, discovery):
+    """
+    Returns a SassDefinition for every sass file, other than partials, under the input_dir of
+    an entry of the SASS setting. The css goes to the same place under output_dir, and each
+    is named after the entry and the file - eg. 'pages/blog/index' for blog/index.scss.
+    """
+    name, input_dir, output_dir = get_details(sass_def, ['input_dir', 'output_dir'])
+    definitions = []
+    for path in discovery.entrypoints(os.path.join(SASS_ROOT, input_dir)):
+        base = os.path.splitext(path)[0]
+        definitions.append(make_definition(
+            '%s/%s' % (name, base.replace(os.path.sep, '/')),
+            os.path.join(input_dir, path),
+            os.path.join(output_dir, base + '.css'),
+        ))
+    return definitions
+
+
+def parse_bundle(bundle_def, definitions):
+    """
+    Returns the SassBundle for an entry of the SASS_BUNDLES setting, checking that its members
+    are all sass definitions.
+    """
+    name, members, sass_output = get_details(bundle_def, ['members', 'output'])
+    if name in definitions:
+        raise SassConfigurationError('Sass bundle has the same name as a sass definition: %s\n' % name)
+    for member in members:
+        if member not in definitions:
+            raise SassConfigurationError('Sass bundle \'%s\' includes an undefined sass name: %s\n' % (name, member))
+    output_file, media_url = get_output(sass_output, bundle_def['details'].get('url'))
+    return SassBundle(name=name, members=tuple(members), output_file=output_file, media_url=media_url)
+
+
+def load():
+    """
+    Parses and validates the SASS and SASS_BUNDLES settings, finding the sass files of
+    directory entries. Returns a dict of name to SassDefinition, which remembers the order of
+    the setting.
+    """
+    return parse()[0]
+
+
+def parse():
+    # returns the definitions, bundles and directories searched, which are kept until reset.
+    global _definitions, _bundles, _directories
+    definitions = OrderedDict()
+    discovery = Discovery()
+    for sass_def in getattr(settings, "SASS", ()):
+        if isinstance(sass_def, dict) and 'input_dir' in (sass_def.get('details') or {}):
+            parsed = parse_directory_definition(sass_def, discovery)
+        else:
+            parsed = [parse_definition(sass_def)]
+        for definition in parsed:
+            if definition.name in definitions:
+                raise SassConfigurationError('Sass name defined more than once: %s\n' % definition.name)
+            definitions[definition.name] = definition
+    discovery.save()
+    bundles = OrderedDict()
+    for bundle_def in getattr(settings, "SASS_BUNDLES", ()):
+        bundle = parse_bundle(bundle_def, definitions)
+        if bundle.name in bundles:
+            raise SassConfigurationError('Sass bundle defined more than once: %s\n' % bundle.name)
+        bundles[bundle.name] = bundle
+    directories = discovery.directories()
+    with _lock:
+        _definitions = definitions
+        _bundles = bundles
+        _directories = directories
+    return definitions, bundles, directories
+
+
+def loaded():
+    # the three are read together, so a reset can't leave a getter with only some of them.
+    with _lock:
+        state = _definitions, _bundles, _directories
+    if state[0] is None:
+        state = parse()
+    return state
+
+
+def get_definitions():
+    """
+    Returns the SassDefinitions for the SASS setting, in the order they are defined. The
+    setting is only parsed once, and again whenever it is changed.
+    """
+    return list(loaded()[0].values())
+
+
+def get_definition(name):
+    """
+    Returns the named SassDefinition, or None if there isn't one.
+    """
+    return loaded()[0].get(name)
+
+
+def get_bundles():
+    """
+    Returns the SassBundles for the SASS_BUNDLES setting, in the order they are defined.
+    """
+    return list(loaded()[1].values())
+
+
+def get_bundle(name):
+    """
+    Returns the named SassBundle, or None if there isn't one.
+    """
+    return loaded()[1].get(name)
+
+
+def get_outputs():
+    """
+    Returns a dict of the path within SASS_ROOT of each css file generated for the SASS and
+    SASS_BUNDLES settings to the names of the definitions it is generated from. Css generated
+    outside SASS_ROOT is left out.
+    """
+    outputs = OrderedDict()
+    for definition in get_definitions():
+        outputs[definition.output_file] = [definition.name]
+    for bundle in get_bundles():
+        outputs[bundle.output_file] = list(bundle.members)
+    return OrderedDict((os.path.relpath(path, SASS_ROOT).replace(os.path.sep, '/'), names)
+                       for path, names in outputs.items() if path.startswith(os.path.join(SASS_ROOT, '')))
+
+
+def get_directories():
+    """
+    Returns the directories searched for the sass files of directory entries, so new files
+    can be watched for.
+    """
+    return list(loaded()[2])
+
+
+def reset(sender=None, setting=None, **kwargs):
+    # setting_changed receiver - the SASS setting is parsed again when next needed.
+    global _definitions, _bundles, _directories
+    if setting in (None, 'SASS', 'SASS_BUNDLES'):
+        with _lock:
+            _definitions = None
+            _bundles = None
+            _directories = []
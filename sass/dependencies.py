@@ -0,0 +1,166 @@
+import os
+import re
+import json
+
+from django.conf import settings
+
+from sass.models import SASS_ROOT
+
+
+# @import, @use and @forward all pull in another stylesheet. Everything up to the end of the
+# statement is captured so that comma separated @import lists can be split afterwards. Scss
+# statements end with a semicolon and may run over several lines; those of the indented
+# syntax end with the line.
+IMPORT_RE = re.compile(r'@(import|use|forward)\s+([^;]+)')
+INDENTED_IMPORT_RE = re.compile(r'@(import|use|forward)\s+([^;\n]+)')
+STRING_RE = re.compile(r'''(["'])(.+?)\1''')
+BLOCK_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+LINE_COMMENT_RE = re.compile(r'(^|[^:])//[^\n]*')
+
+SASS_EXTENSIONS = ('.scss', '.sass', '.css')
+
+
+def get_load_paths():
+    """
+    Returns the absolute directories listed in the SASS_LOAD_PATHS setting. Relative
+    entries are taken to be relative to SASS_ROOT.
+    """
+    return [os.path.join(SASS_ROOT, path) for path in getattr(settings, 'SASS_LOAD_PATHS', ())]
+
+
+def parse_imports(filename):
+    """
+    Returns the raw targets of every @import, @use and @forward statement in the file.
+    Plain CSS imports, remote urls and built in modules (sass:math etc.) are skipped since
+    they are never files on disk that we could watch.
+    """
+    with open(filename, 'rb') as fd:
+        content = fd.read().decode('utf-8', 'replace')
+    content = BLOCK_COMMENT_RE.sub('', content)
+    content = LINE_COMMENT_RE.sub(r'\1', content)
+
+    targets = []
+    import_re = INDENTED_IMPORT_RE if filename.endswith('.sass') else IMPORT_RE
+    for keyword, statement in import_re.findall(content):
+        quoted = [match[1] for match in STRING_RE.findall(statement)]
+        if keyword == 'import':
+            # the indented syntax allows unquoted, comma separated imports.
+            candidates = quoted or [part.strip() for part in statement.split(',')]
+        else:
+            # @use/@forward take a single url, optionally followed by 'as', 'with', 'show' etc.
+            candidates = quoted[:1] or statement.split()[:1]
+        for target in candidates:
+            if not target or target.startswith(('sass:', 'http://', 'https://', '//', 'url(')):
+                continue
+            if target.endswith('.css'):
+                continue
+            targets.append(target)
+    return targets
+
+
+def resolve_import(target, base_dir, load_paths):
+    """
+    Finds the file sass would load for the import target, following the sass rules for
+    partials (_name), implicit extensions and index files. Returns None if it cannot be found.
+    """
+    for directory in [base_dir] + list(load_paths):
+        path = os.path.normpath(os.path.join(directory, target))
+        dirname, basename = os.path.split(path)
+        if os.path.splitext(basename)[1] in SASS_EXTENSIONS:
+            candidates = [path, os.path.join(dirname, '_' + basename)]
+        else:
+            candidates = []
+            for ext in SASS_EXTENSIONS:
+                candidates.append(os.path.join(dirname, basename + ext))
+                candidates.append(os.path.join(dirname, '_' + basename + ext))
+            for ext in SASS_EXTENSIONS:
+                candidates.append(os.path.join(path, '_index' + ext))
+                candidates.append(os.path.join(path, 'index' + ext))
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+class DependencyGraph(object):
+    """
+    Resolves the transitive set of files each entrypoint depends on. The parsed imports of
+    every file are cached on the graph, so partials shared between many entrypoints are only
+    read once per run.
+    """
+
+    def __init__(self, load_paths=None):
+        if load_paths is None:
+            load_paths = get_load_paths()
+        self.load_paths = load_paths
+        self._edges = {}
+
+    def imports(self, filename):
+        if filename not in self._edges:
+            resolved = []
+            try:
+                targets = parse_imports(filename)
+            except (IOError, OSError):
+                targets = []
+            base_dir = os.path.dirname(filename)
+            for target in targets:
+                path = resolve_import(target, base_dir, self.load_paths)
+                if path and path not in resolved:
+                    resolved.append(path)
+            self._edges[filename] = resolved
+        return self._edges[filename]
+
+    def forget(self, paths):
+        """
+        Drops the cached imports of the files, so they are parsed again when next needed.
+        """
+        for path in paths:
+            self._edges.pop(path, None)
+
+    def dependencies(self, input_file):
+        """
+        Returns the sorted list of files imported, directly or not, by the input file.
+        """
+        seen = set([input_file])
+        pending = [input_file]
+        while pending:
+            for path in self.imports(pending.pop()):
+                if path not in seen:
+                    seen.add(path)
+                    pending.append(path)
+        seen.discard(input_file)
+        return sorted(seen)
+
+    def snapshot(self, input_file):
+        """
+        Returns the dependencies of the input file serialized with their modified times, in
+        the form stored on SassModel.dependencies.
+        """
+        return json.dumps(dict((path, get_modified_time(path)) for path in self.dependencies(input_file)), sort_keys=True)
+
+
+def stat_modified_time(st):
+    # nanoseconds, so that edits within the same second are still seen.
+    return getattr(st, 'st_mtime_ns', None) or int(st.st_mtime * 1000000000)
+
+
+def get_modified_time(path):
+    try:
+        return stat_modified_time(os.stat(path))
+    except OSError:
+        return None
+
+
+def changed_dependencies(sass_model):
+    """
+    Returns the stored dependencies of the model which have been modified (or removed)
+    since it was last compiled.
+    """
+    if not sass_model.dependencies:
+        return []
+    try:
+        snapshot = json.loads(sass_model.dependencies)
+    except ValueError:
+        # unreadable bookkeeping - treat everything as changed.
+        return [sass_model.sass_path]
+    return sorted(path for path, mtime in snapshot.items() if get_modified_time(path) != mtime)
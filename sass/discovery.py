@@ -0,0 +1,107 @@
+import os
+import json
+
+from django.conf import settings
+
+from sass.models import SASS_ROOT
+from sass.utils import atomic_write_json
+from sass.dependencies import stat_modified_time
+
+try:
+    from os import scandir
+except ImportError: # python 2
+    scandir = None
+
+
+# remembers the listing of every directory searched for sass files between runs.
+SASS_DISCOVERY_CACHE = getattr(settings, 'SASS_DISCOVERY_CACHE', os.path.join(SASS_ROOT, '.sass-discovery.json'))
+SASS_EXTENSIONS = ('.scss', '.sass')
+
+
+def list_directory(directory):
+    """
+    Returns the sorted names of the sub-directories and of the sass files in the directory.
+    Hidden entries are skipped.
+    """
+    directories = []
+    files = []
+    if scandir is not None:
+        for entry in scandir(directory):
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                directories.append(entry.name)
+            elif os.path.splitext(entry.name)[1] in SASS_EXTENSIONS:
+                files.append(entry.name)
+    else:
+        for name in os.listdir(directory):
+            if name.startswith('.'):
+                continue
+            if os.path.isdir(os.path.join(directory, name)):
+                directories.append(name)
+            elif os.path.splitext(name)[1] in SASS_EXTENSIONS:
+                files.append(name)
+    return sorted(directories), sorted(files)
+
+
+class Discovery(object):
+    """
+    Finds the sass files under directories. A directory's modified time only changes when
+    entries are added to, removed from or renamed in it, so the listing of a directory which
+    hasn't changed since the last run is taken from SASS_DISCOVERY_CACHE without reading it.
+    """
+
+    def __init__(self, path=SASS_DISCOVERY_CACHE):
+        self.path = path
+        try:
+            with open(path) as fd:
+                self.cached = json.load(fd)
+        except (IOError, OSError, ValueError):
+            self.cached = {}
+        self.listings = {}
+
+    def listing(self, directory):
+        try:
+            mtime = stat_modified_time(os.stat(directory))
+        except OSError:
+            return [], []
+        cached = self.cached.get(directory)
+        if cached and cached[0] == mtime:
+            directories, files = cached[1], cached[2]
+        else:
+            directories, files = list_directory(directory)
+        self.listings[directory] = [mtime, directories, files]
+        return directories, files
+
+    def entrypoints(self, directory):
+        """
+        Returns the paths, relative to the directory, of every sass file under it which isn't a
+        partial.
+        """
+        found = []
+        pending = ['']
+        while pending:
+            relative = pending.pop()
+            directories, files = self.listing(os.path.join(directory, relative) if relative else directory)
+            found.extend(os.path.join(relative, name) for name in files if not name.startswith('_'))
+            pending.extend(os.path.join(relative, name) for name in directories)
+        return sorted(found)
+
+    def directories(self):
+        """
+        Returns every directory searched so far.
+        """
+        return sorted(self.listings)
+
+    def save(self):
+        """
+        Writes the listings of the directories searched by this run, if any changed.
+        """
+        if self.listings == self.cached:
+            return
+        try:
+            atomic_write_json(self.path, self.listings, sort_keys=True)
+        except (IOError, OSError):
+            # the cache only saves time - it is rebuilt next run.
+            pass
+        self.cached = self.listings
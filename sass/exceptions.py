@@ -23,6 +23,14 @@ class SassGenerationError(Exception):
     pass
 
 
+class SassLockedError(Exception):
+    """
+    This ERROR is used when another server's build has locked the
+    state of the css, and we were asked not to wait for it.
+    """
+    pass
+
+
 class SassException(Exception):
     pass
 
@@ -0,0 +1,59 @@
+import os
+import posixpath
+from multiprocessing import cpu_count
+
+from django.contrib.staticfiles.finders import BaseFinder
+from django.contrib.staticfiles.utils import matches_patterns
+from django.core.checks import Error
+from django.core.files.storage import FileSystemStorage
+
+from sass.models import SASS_ROOT
+from sass.definitions import get_definitions, get_outputs
+from sass.exceptions import SassConfigurationError
+
+
+class SassFinder(BaseFinder):
+    """
+    Lets the staticfiles app find the css generated for the SASS and SASS_BUNDLES settings. The
+    css is generated, if it is out of date, when it is looked for - so collectstatic generates
+    the stale css and collects it with the other static files in one pass, and storages such as
+    ManifestStaticFilesStorage hash it like any other file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SassFinder, self).__init__(*args, **kwargs)
+        self.storage = FileSystemStorage(location=SASS_ROOT)
+        self.generated = False
+
+    def check(self, **kwargs):
+        try:
+            get_definitions()
+        except SassConfigurationError as e:
+            return [Error(str(e).strip(), obj=self, id='sass.E001')]
+        return []
+
+    def generate(self, names=None):
+        from sass.management.commands import sassify
+
+        if names is None:
+            # everything only needs to be checked once.
+            if self.generated:
+                return
+            self.generated = True
+        sassify.Command().process_sass(names=names, jobs=cpu_count())
+
+    def find(self, path, all=False):
+        names = get_outputs().get(path)
+        if names is None:
+            return []
+        self.generate(names)
+        match = os.path.join(SASS_ROOT, path)
+        return [match] if all else match
+
+    def list(self, ignore_patterns):
+        self.generate()
+        for path in get_outputs():
+            # like the other finders, the patterns are matched against the file name and the path.
+            ignored = matches_patterns(posixpath.basename(path), ignore_patterns) or matches_patterns(path, ignore_patterns)
+            if not ignored and self.storage.exists(path):
+                yield path, self.storage
@@ -1,13 +1,13 @@
 import os
 from django.db.models import signals
 from sass.models import SassModel
+from sass.dependencies import stat_modified_time
 
 
 def set_last_modified_time(sender, instance, **kwargs):
     # set the last modified time based on the os.stat system call.
-    st_mtime = 8  # last_modified_time column
-    last_modified_time = os.stat(instance.sass_path)[st_mtime]
-    instance.source_modified_time = last_modified_time
+    last_modified_time = stat_modified_time(os.stat(instance.sass_path))
+    instance.source_modified_time = str(last_modified_time)
 
 
 def start_listening():
@@ -0,0 +1,37 @@
+import os
+import errno
+import fcntl
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from sass.models import SASS_ROOT
+
+
+SASS_LOCK_FILE = getattr(settings, 'SASS_LOCK_FILE', os.path.join(SASS_ROOT, '.sass.lock'))
+# also lock the SassModel rows being generated, for sites running on several servers.
+SASS_DB_LOCK = getattr(settings, 'SASS_DB_LOCK', False)
+
+
+@contextmanager
+def build_lock(wait=True):
+    """
+    Holds an exclusive lock on SASS_LOCK_FILE, so only one process (or thread) on this
+    machine generates css at a time. With wait=False it gives up straight away if the lock
+    is taken - the value yielded says whether the lock was acquired.
+    """
+    fd = os.open(SASS_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
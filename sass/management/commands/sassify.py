@@ -1,14 +1,33 @@
 import os
-import subprocess
+import math
+import time
+import itertools
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from optparse import make_option
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.conf import settings
 from django.core.management.color import no_style
 
-from sass.models import SASS_ROOT, SassModel
-from sass.utils import update_needed
-from sass.exceptions import SassConfigException, SassConfigurationError, SassCommandArgumentError, SassException
+from sass.models import SASS_FINGERPRINT, SASS_MANIFEST, SassModel, output_files
+from sass.utils import atomic_copy, hash_file, hash_files, rebuild_reason, temporary_path, update_needed
+from sass.signals import pre_compile, post_compile
+from sass.locks import SASS_DB_LOCK, build_lock
+from sass.bundles import build_bundle, bundle_files
+from sass.manifest import load_manifest, update_manifest, remove_manifest
+from sass.compression import SASS_BROTLI, SASS_GZIP, COMPRESSION_EXTENSIONS, compress_file
+from sass.listeners import set_last_modified_time
+from sass.dependencies import DependencyGraph, changed_dependencies
+from sass import definitions
+from sass.state import get_store
+from sass.storage import delete_files, get_storage, upload_files
+from sass.compilers import get_compiler
+from sass.postprocess import SASS_POSTPROCESSORS, get_postprocessors, process_file
+from sass.cache import get_cache
+from sass.watcher import get_watcher, wait_for_changes
+from sass.exceptions import SassConfigException, SassCommandArgumentError, SassException, SassLockedError
 
 
 class Command(BaseCommand):
@@ -26,117 +45,556 @@ class Command(BaseCommand):
     style = no_style()
 
     option_list = BaseCommand.option_list + (
-        make_option('--style', '-t', dest='sass_style', default='nested', help='Sass output style. Can be nested (default), compact, compressed, or expanded.'),
+        make_option('--style', '-t', dest='sass_style', default=None, help='Sass output style. Can be nested (default), compact, compressed, or expanded.'),
         make_option('--list', '-l', action='store_true', dest='list_sass' , default=None, help='Display information about the status of your sass files.'),
         make_option('--force', '-f', action='store_true', dest='force_sass', default=False, help='Force sass to run.'),
         make_option('--clean', '-c', action='store_true', dest='clean', default=False, help='Remove all the generated CSS files.'),
+        make_option('--stats', '-s', action='store_true', dest='stats', default=False, help='Display the cost of the last build of each sass file, slowest first.'),
+        make_option('--watch', '-w', action='store_true', dest='watch', default=False, help='Keep running and regenerate the css whenever the sass files change.'),
+        make_option('--jobs', '-j', type='int', dest='jobs', default=None, help='Number of sass processes to run at once. Defaults to the number of CPUs.'),
     )
     help = 'Converts Sass files into CSS.'
 
 
     def __init__(self, *args, **kwargs):
         super(Command, self).__init__(*args, **kwargs)
-        self.bin = getattr(settings, "SASS_BIN", None)
-        if not self.bin:
-            raise SassConfigurationError('SASS_BIN is not defined in settings.py file.')
-        # test that the binary actually exists.
-        if not os.path.exists(self.bin):
-            raise SassConfigurationError('Sass binary defined by SASS_BIN does not exist: %s' % self.bin)
-
+        self._compiler = None
         self.sass_style = getattr(settings, "SASS_STYLE", 'nested')
+        self.batch = getattr(settings, "SASS_BATCH", True)
+        self.graph = DependencyGraph()
+        self.cache = get_cache()
+        self.store = get_store()
+        self.storage = get_storage()
+        self.postprocessors = get_postprocessors()
+        self.savings = {}
+
+
+    @property
+    def compiler(self):
+        # created when something is first compiled, so --list, --stats and --clean (and
+        # builds with nothing to do) work without SASS_BIN.
+        if self._compiler is None:
+            self._compiler = get_compiler()
+        return self._compiler
+
+
+    @compiler.setter
+    def compiler(self, compiler):
+        self._compiler = compiler
 
 
     def handle(self, *args, **kwargs):
         # make sure the Sass style given is valid.
-        self.sass_style = kwargs.get('sass_style')
+        self.sass_style = kwargs.get('sass_style') or self.sass_style
         if self.sass_style not in ('nested', 'compact', 'compressed', 'expanded'):
             raise SassCommandArgumentError("Invalid sass style argument: %s" % self.sass_style)
 
         force = kwargs.get('force_sass')
         list_sass = kwargs.get('list_sass')
         clean = kwargs.get('clean')
+        watch = kwargs.get('watch')
+        stats = kwargs.get('stats')
+        jobs = kwargs.get('jobs')
+        if jobs is None:
+            jobs = cpu_count()
+        if jobs < 1:
+            raise SassCommandArgumentError("Invalid jobs argument: %s" % jobs)
 
         # we process the args in the order of least importance to hopefully stop
         # any unwanted permanent behavior.
 
         if list_sass:
             self.list()
+        elif stats:
+            self.stats()
         elif clean:
             self.clean()
+        elif watch:
+            self.watch(force=force, jobs=jobs)
         else:
-            self.process_sass(force=force)
+            self.report(self.process_sass(force=force, jobs=jobs))
 
 
-    def get_sass_definitions(self):
-        definitions = []
-        for sass_def in getattr(settings, "SASS", ()):
-            try:
-                sd = {
-                    'name' : sass_def['name'],
-                    'input_file' : os.path.join(SASS_ROOT, sass_def['details']['input']),
-                    'output_file' : os.path.join(SASS_ROOT, sass_def['details']['output']),
-                    # 'media_output' : settings.MEDIA_URL + urlquote(sass_def['details']['output']),
-                }
-                definitions.append(sd)
-            except KeyError:
-                raise SassConfigurationError("Improperly defined SASS definition.")
-        return definitions
-
-
-    def process_sass(self, name=None, force=False):
+    def report(self, timings):
+        for name, elapsed in timings:
+            print("Generated css for '%s' in %.2fs." % (name, elapsed))
+            for stage, saved in self.savings.get(name, ()):
+                print("\t%s saved %d bytes." % (stage, saved))
+
+
+    def get_sass_definitions(self, names=None):
+        """
+        Returns the SassDefinitions of the named definitions, or of all of them.
+        """
+        if names is None:
+            return definitions.get_definitions()
+        return [definition for definition in map(definitions.get_definition, names) if definition is not None]
+
+
+    def process_sass(self, name=None, force=False, jobs=1, names=None, wait=True):
+        """
+        Generates the css for the named definitions (or all of them) which are out of date.
+        Only one process generates css at a time; the others wait for it and then find the
+        css up to date, or with wait=False return straight away without generating anything.
+        """
         if force:
             print("Forcing sass to run on all files.")
-        sass_definitions = self.get_sass_definitions()
-        for sass_def in sass_definitions:
-            if not name or name == sass_def['name']:
-                self.generate_css_file(force=force, **sass_def)
+        if name:
+            names = [name]
+        with build_lock(wait=wait) as locked:
+            if not locked:
+                return []
+            if SASS_DB_LOCK:
+                self.store.create_lock()
+                with transaction.atomic():
+                    return self.process_definitions(names, force, jobs, wait)
+            return self.process_definitions(names, force, jobs, wait)
+
+
+    def process_definitions(self, names, force, jobs, wait=True):
+        stale = self.get_stale_models(names, force, wait)
+        if stale is None:
+            # another server is generating the css - what it generated before is served meanwhile.
+            return []
+        timings = self.compile(stale, jobs=jobs)
+        self.build_bundles(names)
+        return timings
 
 
+    def build_bundles(self, names=None):
+        """
+        Rebuilds the bundles including any of the named definitions (or all of them) whose
+        members' css has changed, and adds their urls to the manifest.
+        """
+        bundles = [bundle for bundle in definitions.get_bundles() if names is None or set(bundle.members) & set(names)]
+        if not bundles:
+            return
+        sass_objs = self.store.get_many(set(itertools.chain(*[bundle.members for bundle in bundles])))
+        manifest = load_manifest()
+        urls = {}
+        for bundle in bundles:
+            url = build_bundle(bundle, sass_objs, self.storage)
+            if url is not None and manifest.get(bundle.name) != url:
+                urls[bundle.name] = url
+        if urls:
+            update_manifest([], urls)
+
+
+    def get_stale_models(self, names, force, wait=True):
+        """
+        Returns the models of the named definitions (or all of them) whose css needs to be
+        generated. With SASS_DB_LOCK and wait=False, returns None if another server's build
+        has locked the state.
+        """
+        stale = []
+        sass_definitions = self.get_sass_definitions(names)
+        names = [definition.name for definition in sass_definitions]
+        if SASS_DB_LOCK:
+            try:
+                # in a savepoint, so the transaction can carry on if the state is locked.
+                with transaction.atomic():
+                    sass_objs = self.store.get_many(names, lock=True, nowait=not wait)
+            except SassLockedError:
+                return None
+        else:
+            sass_objs = self.store.get_many(names)
+        for definition in sass_definitions:
+            sass_obj = self.get_stale_model(force, definition.name, definition.input_file, definition.output_file, sass_objs.get(definition.name))
+            if sass_obj is not None:
+                stale.append(sass_obj)
+        if not os.path.exists(SASS_MANIFEST):
+            # a fresh manifest needs the entries which are already up to date as well.
+            update_manifest(sass_objs.values())
+        return stale
+
 
     def generate_css_file(self, force, name, input_file, output_file, **kwargs):
+        with build_lock():
+            orig_sass_obj = self.store.get_many([name]).get(name)
+            sass_obj = self.get_stale_model(force, name, input_file, output_file, orig_sass_obj)
+            if sass_obj is not None:
+                self.compile([sass_obj])
+
+
+    def build_model(self, name, input_file, output_file, orig_sass_obj):
+        """
+        Returns a SassModel holding the current settings for the definition, carrying over
+        the bookkeeping of the stored model (if there is one) without querying for it again.
+        """
+        sass_obj = SassModel(name=name, sass_path=input_file, css_path=output_file, style=self.sass_style)
+        if orig_sass_obj is not None:
+            sass_obj.source_modified_time = orig_sass_obj.source_modified_time
+            sass_obj.dependencies = orig_sass_obj.dependencies
+            sass_obj.css_hash = orig_sass_obj.css_hash
+            sass_obj.css_size = orig_sass_obj.css_size
+            sass_obj.gzip_size = orig_sass_obj.gzip_size
+            sass_obj.brotli_size = orig_sass_obj.brotli_size
+            sass_obj._state.adding = False
+        return sass_obj
+
+
+    def get_stale_model(self, force, name, input_file, output_file, orig_sass_obj=None, **kwargs):
+        """
+        Returns the SassModel for the definition if its css needs to be generated, or None if
+        it is up to date.
+        """
         # check that the sass input file actually exists.
         if not os.path.exists(input_file):
             raise SassConfigException('The input \'%s\' does not exist.\n' %input_file)
-        output_path = output_file.rsplit('/', 1)[0]
+        output_path = os.path.dirname(output_file)
         if not os.path.exists(output_path):
-            # try to create path
+            # try to create path - the css of directory entries can go in new sub-directories.
+            try:
+                os.makedirs(output_path)
+            except OSError as e:
+                if not os.path.isdir(output_path):
+                    raise SassConfigException("Output path could not be created: %s (%s)\n" % (output_path, e))
+
+        sass_obj = self.build_model(name, input_file, output_file, orig_sass_obj)
+        if orig_sass_obj is None:
+            sass_obj.rebuild_reason = 'new'
+        elif force:
+            sass_obj.rebuild_reason = 'forced'
+        else:
+            sass_obj.rebuild_reason = rebuild_reason(sass_obj, orig_sass_obj)
+        if sass_obj.rebuild_reason:
+            return sass_obj
+        return None
+
+
+    def compile(self, sass_objs, jobs=1):
+        """
+        Runs sass on each of the models, using up to 'jobs' compiler calls at once. Every model
+        is attempted even if some fail; the failures are raised together once all are done.
+        The pre_compile and post_compile signals are sent for each model. Returns a list of
+        (name, seconds taken) for the css files generated.
+        """
+        restored, sass_objs = self.prepare(sass_objs)
+        batches = self.get_batches(sass_objs, jobs)
+        if jobs > 1 and len(batches) > 1:
+            pool = ThreadPool(min(jobs, len(batches)))
             try:
-                os.mkdirs(output_path, 0o644)
-            except os.error as e:
-                raise SassConfigException(e.message)
-            except AttributeError as e:
-                # we have an older version of python that doesn't support os.mkdirs - fail gracefully.
-                raise SassConfigException("Output path does not exist - please create manually: %s\n" % output_path)
+                results = pool.map(self.run_batch, batches)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self.run_batch(batch) for batch in batches]
+        return self.finish(restored, results, jobs)
+
+
+    def prepare(self, sass_objs):
+        """
+        Sends pre_compile for each of the models and restores what it can from the compile
+        cache. Returns the models restored and the models which still need compiling.
+        """
+        for sass_obj in sass_objs:
+            # the modified times are taken before sass runs, so a file saved while it does is
+            # seen as changed by the next build.
+            set_last_modified_time(SassModel, sass_obj)
+            sass_obj.dependencies = self.graph.snapshot(sass_obj.sass_path)
+            pre_compile.send(sender=SassModel, sass_obj=sass_obj, reason=sass_obj.rebuild_reason)
+        return self.restore_from_cache(sass_objs)
+
+
+    def finish(self, restored, results, jobs=1):
+        """
+        Records the outcome of the compiler runs - lists of (model, error output) - along with
+        the models restored from the cache, and sends post_compile for each.
+        """
+        compiled = []
+        errors = []
+        for sass_obj, error in itertools.chain(*results):
+            if error is not None:
+                errors.append("%s: %s" % (sass_obj.name, error))
+                post_compile.send(sender=SassModel, sass_obj=sass_obj, error=error, metrics=sass_obj.metrics())
+                continue
+            sass_obj.cache_hit = False
+            if self.cache is not None:
+                self.cache.put(sass_obj.cache_key, sass_obj.css_path)
+            compiled.append(sass_obj)
+        if self.cache is not None and compiled:
+            self.cache.evict()
+        compiled = restored + compiled
+        digests = hash_files([sass_obj.css_path for sass_obj in compiled], jobs=jobs)
+        for sass_obj in compiled:
+            changed = self.publish(sass_obj, digests[sass_obj.css_path])
+            if self.storage is not None:
+                upload_files(self.storage, sass_obj.generated_files(), changed)
+            sass_obj.input_size = sum(os.path.getsize(path) for path in [sass_obj.sass_path] + self.graph.dependencies(sass_obj.sass_path) if os.path.exists(path))
+        self.save_models(compiled)
+        if compiled:
+            update_manifest(compiled)
+        for sass_obj in compiled:
+            post_compile.send(sender=SassModel, sass_obj=sass_obj, error=None, metrics=sass_obj.metrics())
+        if errors:
+            raise SassException("\n".join(errors))
+        return [(sass_obj.name, sass_obj.compile_time) for sass_obj in compiled]
+
 
+    def restore_from_cache(self, sass_objs):
+        """
+        Copies the css of any of the models found in the compile cache into place. Returns the
+        models restored and the models which still need compiling.
+        """
+        if self.cache is None or not sass_objs:
+            return [], sass_objs
+        restored = []
+        missed = []
+        # css post-processed differently isn't reused either.
+        version = ' '.join((self.compiler.version(),) + tuple(SASS_POSTPROCESSORS))
+        # every file is hashed by a single pool, rather than one for each model.
+        paths = set()
+        for sass_obj in sass_objs:
+            paths.add(sass_obj.sass_path)
+            paths.update(self.graph.dependencies(sass_obj.sass_path))
+        digests = hash_files(paths)
+        for sass_obj in sass_objs:
+            start = time.time()
+            sass_obj.cache_key = self.cache.key(sass_obj.sass_path, self.graph.dependencies(sass_obj.sass_path), sass_obj.style, version, digests)
+            # forcing a build means really running sass, though the result is still cached.
+            if sass_obj.rebuild_reason != 'forced' and self.cache.get(sass_obj.cache_key, sass_obj.css_path):
+                sass_obj.compile_time = time.time() - start
+                sass_obj.startup_time = 0
+                sass_obj.batch_size = 1
+                sass_obj.cache_hit = True
+                restored.append(sass_obj)
+            else:
+                missed.append(sass_obj)
+        return restored, missed
+
+
+    def publish(self, sass_obj, digest):
+        """
+        Writes the files derived from newly generated css - the fingerprinted copy and the
+        compressed copies. The compressed copies are only rewritten when the css has changed.
+        Returns whether it has.
+        """
+        changed = digest != sass_obj.css_hash
+        sass_obj.css_hash = digest
+        sass_obj.css_size = os.path.getsize(sass_obj.css_path)
+        paths = [sass_obj.css_path]
+        if SASS_FINGERPRINT:
+            paths.append(sass_obj.fingerprinted_css_path())
+            if not os.path.exists(sass_obj.fingerprinted_css_path()):
+                atomic_copy(sass_obj.css_path, sass_obj.fingerprinted_css_path())
+        if SASS_GZIP or SASS_BROTLI:
+            missing = [path for path in paths if SASS_GZIP and not os.path.exists(path + '.gz') or SASS_BROTLI and not os.path.exists(path + '.br')]
+            if changed or missing:
+                sass_obj.gzip_size, sass_obj.brotli_size = compress_file(sass_obj.css_path)
+                for path in paths[1:]:
+                    for ext in COMPRESSION_EXTENSIONS:
+                        if os.path.exists(sass_obj.css_path + ext):
+                            atomic_copy(sass_obj.css_path + ext, path + ext)
+        else:
+            sass_obj.gzip_size = sass_obj.brotli_size = None
+        return changed
+
+
+    def save_models(self, sass_objs):
+        """
+        Stores the models with a single write to the state store. Bulk writes don't send
+        pre_save, so the source modified time has already been set by prepare().
+        """
+        if sass_objs:
+            self.store.save_many(sass_objs)
+
+
+    def get_batches(self, sass_objs, jobs):
+        """
+        Groups the models into the sass processes that will generate them. Models sharing a
+        style are compiled together by a single process, split over at most 'jobs' processes
+        so batching doesn't cost us the parallelism.
+        """
+        if not sass_objs:
+            return []
+        if not (self.batch and self.compiler.supports_batch):
+            return [[sass_obj] for sass_obj in sass_objs]
+        styles = []
+        groups = {}
+        for sass_obj in sass_objs:
+            if sass_obj.style not in groups:
+                styles.append(sass_obj.style)
+                groups[sass_obj.style] = []
+            groups[sass_obj.style].append(sass_obj)
+        batches = []
+        for style in styles:
+            group = groups[style]
+            size = int(math.ceil(len(group) / float(jobs)))
+            batches.extend(group[i:i + size] for i in range(0, len(group), size))
+        return batches
+
+
+    def run_batch(self, sass_objs):
+        """
+        Generates all the models with one call to the compiler. If that fails, each file is
+        run on its own so the error is reported against the right file. Returns a list of
+        (model, error output) and sets the compile and startup times on the models - the
+        times of a shared call are split evenly between its files.
+        """
+        if not self.can_batch(sass_objs):
+            return [self.run_sass(sass_obj) for sass_obj in sass_objs]
+
+        error = self.run_compiler(sass_objs)
+        if error is not None:
+            return [self.run_sass(sass_obj) for sass_obj in sass_objs]
+        return [(sass_obj, None) for sass_obj in sass_objs]
+
+
+    def can_batch(self, sass_objs):
+        # sass separates the input and output of a batch with a colon.
+        paths = [sass_obj.sass_path for sass_obj in sass_objs] + [sass_obj.css_path for sass_obj in sass_objs]
+        return len(sass_objs) > 1 and not any(':' in path for path in paths)
+
+
+    def run_sass(self, sass_obj):
+        """
+        Runs the compiler for a single model. Returns the model and the error output (None on
+        success).
+        """
+        return sass_obj, self.run_compiler([sass_obj])
+
+
+    def run_compiler(self, sass_objs):
+        # this is called from the worker threads, so it must not touch the database. The css
+        # is written to temporary files which are renamed into place once sass has finished,
+        # so a half written file is never served.
+        pairs = self.get_pairs(sass_objs)
+        start = time.time()
+        error, startup_time = self.compiler.compile(pairs, sass_objs[0].style, self.graph.load_paths)
+        return self.store_output(sass_objs, pairs, error, time.time() - start, startup_time)
+
+
+    def get_pairs(self, sass_objs):
+        return [(sass_obj.sass_path, temporary_path(sass_obj.css_path)) for sass_obj in sass_objs]
+
+
+    def store_output(self, sass_objs, pairs, error, elapsed, startup_time):
+        """
+        Moves the css written to the temporary paths into place, or removes it if the compiler
+        failed.
+        """
+        for sass_obj, (input_file, tmp) in zip(sass_objs, pairs):
+            sass_obj.compile_time = elapsed / len(sass_objs)
+            sass_obj.startup_time = startup_time / len(sass_objs)
+            sass_obj.batch_size = len(sass_objs)
+            if error is None:
+                if self.postprocessors:
+                    sass_obj.postprocess_savings = self.savings[sass_obj.name] = process_file(tmp, self.postprocessors)
+                # the temporary file's name is never seen again, so its hash isn't kept.
+                if os.path.exists(sass_obj.css_path) and hash_file(tmp, cache=False) == hash_file(sass_obj.css_path):
+                    # the css hasn't changed - keep the old file, so its modified time doesn't either.
+                    os.remove(tmp)
+                else:
+                    os.rename(tmp, sass_obj.css_path)
+            elif os.path.exists(tmp):
+                os.remove(tmp)
+        return error
+
+
+    def watch(self, force=False, jobs=1):
+        """
+        Generates the css, then waits for the sass files (or the partials they import) to change
+        and regenerates the definitions affected by each change.
+        """
+        watcher = get_watcher()
+        print("Watching for changes with %s. Press Ctrl-C to stop." % watcher.__class__.__name__)
+        names = None
         try:
-            sass_obj = SassModel.objects.get(name=name)
-            was_created = False
-        except SassModel.DoesNotExist:
-            sass_obj = SassModel(name=name)
-            was_created = True
-
-        sass_obj.sass_path = input_file
-        sass_obj.css_path = output_file
-
-        needs_update = was_created or force or update_needed(sass_obj)
-        if needs_update:
-            sass_dict = { 'bin' : self.bin, 'sass_style' : self.sass_style, 'input' : input_file, 'output' : output_file }
-            cmd = "%(bin)s -t %(sass_style)s -C %(input)s > %(output)s" %sass_dict
-            p = subprocess.Popen([self.bin, "-t", self.sass_style, "--no-cache", input_file, output_file])
-            stdout, stderr = p.communicate()
-            if p.returncode != 0: # Process failed (nonzero exit code)
-                raise SassException(stderr)
-            sass_obj.save()
+            while True:
+                try:
+                    self.report(self.process_sass(force=force, jobs=jobs, names=names))
+                except (SassException, SassConfigException) as e:
+                    print(e)
+                force = False
+                watched = self.get_watched_files()
+                watcher.watch(set(watched) | set(self.graph.load_paths) | set(definitions.get_directories()))
+                changed = wait_for_changes(watcher)
+                self.graph.forget(changed)
+                names = self.get_affected_names(watched, changed)
+                if names is None:
+                    # sass files may have been added to or removed from directory entries.
+                    definitions.reset()
+        except KeyboardInterrupt:
+            pass
+
+
+    def get_watched_files(self):
+        """
+        Returns a dict of every sass file in use, and the partials they import, to the names of
+        the definitions which depend on it.
+        """
+        watched = {}
+        for definition in self.get_sass_definitions():
+            for path in [definition.input_file] + self.graph.dependencies(definition.input_file):
+                watched.setdefault(path, set()).add(definition.name)
+        return watched
+
+
+    def get_affected_names(self, watched, changed):
+        """
+        Returns the names of the definitions affected by the changed paths, or None if they
+        could all be - eg. a new partial was created, or a sass file removed.
+        """
+        directories = set(os.path.normpath(directory) for directory in definitions.get_directories())
+        names = set()
+        for path in changed:
+            if path in watched and os.path.exists(path) and os.path.dirname(path) not in directories:
+                names |= watched[path]
+            elif path in watched or os.path.isdir(path) or os.path.splitext(path)[1] in ('.scss', '.sass'):
+                # the sass files of directory entries have to be found again.
+                return None
+        return names
 
 
     def clean(self):
-        for s in SassModel.objects.all():
+        # a build running meanwhile would write css as it is removed.
+        with build_lock():
+            removed = []
             try:
-                print("Removing css: %s" % s.css_path)
-                os.remove(s.css_path)
-                s.delete()
-            except OSError as e:
-                raise e
+                for s in self.store.all():
+                    print("Removing css: %s" % s.css_path)
+                    # the fingerprinted copies of earlier builds are removed as well.
+                    paths = output_files(s.css_path)
+                    if self.storage is not None:
+                        delete_files(self.storage, paths)
+                    for path in paths:
+                        os.remove(path)
+                    removed.append(s.name)
+            finally:
+                self.store.delete_many(removed)
+            for bundle in definitions.get_bundles():
+                for path in bundle_files(bundle):
+                    print("Removing css: %s" % path)
+                    if self.storage is not None:
+                        delete_files(self.storage, [path])
+                    os.remove(path)
+            remove_manifest()
+
+
+    def stats(self):
+        """
+        Lists the cost of the last build of each sass file, the slowest first. Files generated
+        by the same sass process only have its times split between them, so they are marked.
+        """
+        sass_objs = self.store.get_many([definition.name for definition in self.get_sass_definitions()]).values()
+        sass_objs = sorted(sass_objs, key=lambda sass_obj: sass_obj.compile_time or 0, reverse=True)
+        print("%-30s %9s %9s %6s %10s %10s %10s  %s" % ('name', 'time', 'startup', 'batch', 'input', 'output', 'gzip', 'reason'))
+        for sass_obj in sass_objs:
+            print("%-30s %8.3fs %8.3fs %6s %10s %10s %10s  %s%s" % (
+                sass_obj.name,
+                sass_obj.compile_time or 0,
+                sass_obj.startup_time or 0,
+                sass_obj.batch_size if sass_obj.batch_size > 1 else '-',
+                sass_obj.input_size or '-',
+                sass_obj.css_size or '-',
+                sass_obj.gzip_size or '-',
+                sass_obj.rebuild_reason,
+                ' (cached)' if sass_obj.cache_hit else '',
+            ))
+        if any(sass_obj.batch_size > 1 for sass_obj in sass_objs):
+            print("\nThe times of files generated in a batch are the batch's time split evenly between them.")
+            print("Set SASS_BATCH = False, and run sassify --force, to time each file on its own.")
 
 
     def list(self):
@@ -147,16 +605,13 @@ class Command(BaseCommand):
         """
         # process the Sass information in the settings.
         sass_definitions = self.get_sass_definitions()
-        for sass_def in sass_definitions:
-            print("[%s]" % sass_def["name"])
-            try:
-                sass_obj = SassModel.objects.get(name=sass_def['name'])
-                sass_obj.sass_path = sass_def['input_file']
-                sass_obj.css_path = sass_def['output_file']
-                was_created = False
-            except SassModel.DoesNotExist:
-                sass_obj = SassModel(name=sass_def['name'])
-                was_created = True
-            needs_update = was_created or update_needed(sass_obj)
+        sass_objs = self.store.get_many([definition.name for definition in sass_definitions])
+        for definition in sass_definitions:
+            print("[%s]" % definition.name)
+            orig_sass_obj = sass_objs.get(definition.name)
+            sass_obj = self.build_model(definition.name, definition.input_file, definition.output_file, orig_sass_obj)
+            needs_update = orig_sass_obj is None or update_needed(sass_obj, orig_sass_obj)
             if needs_update:
                 print("\tChanges detected.")
+                for path in changed_dependencies(sass_obj):
+                    print("\tModified import: %s" % path)
@@ -0,0 +1,38 @@
+import os
+import json
+
+from sass.models import SASS_MANIFEST
+from sass.utils import atomic_write_json
+from sass.definitions import get_definition
+
+
+def load_manifest():
+    """
+    Returns the mapping of sass names to versioned css urls written by the sassify
+    command, or an empty dict if it hasn't been written yet.
+    """
+    try:
+        with open(SASS_MANIFEST) as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def update_manifest(sass_objs, urls=None):
+    """
+    Adds the versioned urls of the models, and any other urls by name, to the manifest.
+    """
+    manifest = load_manifest()
+    for sass_obj in sass_objs:
+        # the url comes from the definition, as css generated outside SASS_ROOT has no path
+        # under SASS_URL. Models of definitions since removed are left out.
+        definition = get_definition(sass_obj.name)
+        if sass_obj.css_hash and definition is not None:
+            manifest[sass_obj.name] = sass_obj.versioned_media_path(definition.media_url)
+    manifest.update(urls or {})
+    atomic_write_json(SASS_MANIFEST, manifest, indent=2, sort_keys=True)
+
+
+def remove_manifest():
+    if os.path.exists(SASS_MANIFEST):
+        os.remove(SASS_MANIFEST)
@@ -0,0 +1,33 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404
+
+from sass.models import SASS_URL
+from sass.views import serve
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError: # older versions of django
+    MiddlewareMixin = object
+
+
+class SassMiddleware(MiddlewareMixin):
+    """
+    Serves the css generated by sass from SASS_URL with sass.views.serve, for development -
+    the css is regenerated when its sass changes, and unchanged css costs a 304. Other requests
+    under SASS_URL are passed on.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SassMiddleware, self).__init__(*args, **kwargs)
+        # css served from another host can't be served from here.
+        if not SASS_URL.startswith('/'):
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(SASS_URL):
+            return None
+        path = request.path[len(SASS_URL):]
+        try:
+            return serve(request, path)
+        except Http404:
+            return None
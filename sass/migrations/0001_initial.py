@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 12:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SassModel',
+            fields=[
+                ('name', models.CharField(help_text='Name of the Sass conversion.', max_length=60, primary_key=True, serialize=False)),
+                ('sass_path', models.CharField(help_text='Path submitted for the Sass file.', max_length=255)),
+                ('css_path', models.CharField(help_text='Path to the generated CSS file.', max_length=255)),
+                ('style', models.CharField(choices=[], help_text='The style used when creating the css file.', max_length=10)),
+                ('source_modified_time', models.CharField(help_text='Last time the source file was modified.', max_length=12)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 12:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sass', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sassmodel',
+            name='dependencies',
+            field=models.TextField(blank=True, default='', help_text='Files imported by the Sass file and their modified times.'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 12:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sass', '0002_sassmodel_dependencies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sassmodel',
+            name='css_hash',
+            field=models.CharField(blank=True, default='', help_text='MD5 of the generated CSS file.', max_length=32),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 12:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sass', '0003_sassmodel_css_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sassmodel',
+            name='source_modified_time',
+            field=models.CharField(help_text='Last time the source file was modified.', max_length=20),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 13:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sass', '0004_sassmodel_source_modified_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sassmodel',
+            name='brotli_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Size in bytes of the brotli compressed CSS file.', null=True),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='css_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Size in bytes of the generated CSS file.', null=True),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='gzip_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Size in bytes of the gzipped CSS file.', null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-18 13:19
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sass', '0005_sassmodel_sizes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sassmodel',
+            name='batch_size',
+            field=models.PositiveIntegerField(default=1, help_text='Number of files generated by the same compiler call, which share its times.'),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='cache_hit',
+            field=models.BooleanField(default=False, help_text='Whether the CSS file was restored from the cache rather than generated.'),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='compile_time',
+            field=models.FloatField(blank=True, help_text='Seconds taken to generate the CSS file.', null=True),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='input_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Size in bytes of the Sass file and its imports.', null=True),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='rebuild_reason',
+            field=models.CharField(blank=True, default='', help_text='Why the CSS file was last generated.', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='sassmodel',
+            name='startup_time',
+            field=models.FloatField(blank=True, help_text='Seconds taken to start the compiler.', null=True),
+        ),
+    ]
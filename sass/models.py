@@ -1,9 +1,30 @@
+import os
+import glob
+
 from django.db import models
 from django.conf import settings
 from django.utils.http import urlquote
 
 SASS_ROOT = getattr(settings, 'SASS_ROOT', settings.MEDIA_ROOT)
 SASS_URL = getattr(settings, 'SASS_URL', settings.MEDIA_URL)
+SASS_FINGERPRINT = getattr(settings, 'SASS_FINGERPRINT', False)
+SASS_MANIFEST = getattr(settings, 'SASS_MANIFEST', os.path.join(SASS_ROOT, 'sass-manifest.json'))
+
+
+def fingerprinted_path(path, digest):
+    # css/test.css -> css/test.<hash>.css
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, digest[:12], ext)
+
+
+def output_files(path):
+    """
+    Returns the paths of every file generated for the css file which currently exists - the
+    file, the fingerprinted copies from every build and their compressed copies.
+    """
+    root, ext = os.path.splitext(path)
+    paths = [path] + sorted(glob.glob('%s.%s%s' % (glob.escape(root), '[0-9a-f]' * 12, ext)))
+    return [path + suffix for path in paths for suffix in ('', '.gz', '.br') if os.path.exists(path + suffix)]
 
 
 class SassModel(models.Model):
@@ -11,17 +32,61 @@ class SassModel(models.Model):
     sass_path = models.CharField(max_length=255, help_text='Path submitted for the Sass file.')
     css_path = models.CharField(max_length=255, help_text='Path to the generated CSS file.')
     style = models.CharField(choices='', max_length=10, help_text='The style used when creating the css file.')
-    source_modified_time = models.CharField(max_length=12, help_text='Last time the source file was modified.')
+    source_modified_time = models.CharField(max_length=20, help_text='Last time the source file was modified.')
+    dependencies = models.TextField(blank=True, default='', help_text='Files imported by the Sass file and their modified times.')
+    css_hash = models.CharField(max_length=32, blank=True, default='', help_text='MD5 of the generated CSS file.')
+    css_size = models.PositiveIntegerField(null=True, blank=True, help_text='Size in bytes of the generated CSS file.')
+    gzip_size = models.PositiveIntegerField(null=True, blank=True, help_text='Size in bytes of the gzipped CSS file.')
+    brotli_size = models.PositiveIntegerField(null=True, blank=True, help_text='Size in bytes of the brotli compressed CSS file.')
+    input_size = models.PositiveIntegerField(null=True, blank=True, help_text='Size in bytes of the Sass file and its imports.')
+    compile_time = models.FloatField(null=True, blank=True, help_text='Seconds taken to generate the CSS file.')
+    startup_time = models.FloatField(null=True, blank=True, help_text='Seconds taken to start the compiler.')
+    batch_size = models.PositiveIntegerField(default=1, help_text='Number of files generated by the same compiler call, which share its times.')
+    cache_hit = models.BooleanField(default=False, help_text='Whether the CSS file was restored from the cache rather than generated.')
+    rebuild_reason = models.CharField(max_length=255, blank=True, default='', help_text='Why the CSS file was last generated.')
 
     def __unicode__(self):
         return self.name
 
-    def relative_css_path(self):
-        return self.css_path.split(SASS_ROOT)[1].lstrip('/')
+    def relative_css_path(self, path=None):
+        return (path or self.css_path).split(SASS_ROOT)[1].lstrip('/')
 
     def css_media_path(self):
         return SASS_URL + urlquote(self.relative_css_path())
 
+    def fingerprinted_css_path(self):
+        return fingerprinted_path(self.css_path, self.css_hash)
+
+    def metrics(self):
+        return {
+            'compile_time': self.compile_time,
+            'startup_time': self.startup_time,
+            'batch_size': self.batch_size,
+            'input_size': self.input_size,
+            'output_size': self.css_size,
+            'cache_hit': self.cache_hit,
+            'reason': self.rebuild_reason,
+            'postprocess_savings': getattr(self, 'postprocess_savings', None),
+        }
+
+    def generated_files(self):
+        """
+        Returns the paths of every file generated for the css which currently exists.
+        """
+        paths = [self.css_path]
+        if self.css_hash:
+            paths.append(self.fingerprinted_css_path())
+        paths += [path + ext for path in paths for ext in ('.gz', '.br')]
+        return [path for path in paths if os.path.exists(path)]
+
+    def versioned_media_path(self, media_url=None):
+        # the url changes whenever the content of the css does, so it can be cached forever. The
+        # url of css generated outside SASS_ROOT has to be given.
+        media_url = media_url or self.css_media_path()
+        if SASS_FINGERPRINT:
+            return fingerprinted_path(media_url, self.css_hash)
+        return '%s?%s' % (media_url, self.css_hash[:12])
+
 
 from sass import listeners
 listeners.start_listening()
@@ -0,0 +1,200 @@
+import io
+import os
+import re
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from sass.utils import temporary_path
+from sass.exceptions import SassConfigurationError
+
+
+# stages run over the generated css, in order, before it is written. Each is the dotted path to
+# a callable taking an iterable of css statements and returning an iterable of css statements.
+SASS_POSTPROCESSORS = getattr(settings, 'SASS_POSTPROCESSORS', ())
+
+CHUNK_SIZE = 64 * 1024
+
+TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/|[{};]|[^"\'/{};]+|/', re.S)
+# the parts of css which must be left as they are - strings, urls and comments.
+PROTECTED_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\([^)]*\)|/\*.*?\*/)', re.S)
+MATH_RE = re.compile(r'\b(?:calc|min|max|clamp)\(')
+ZERO_UNIT_RE = re.compile(r'(?<![\w.#-])0(?:\.0+)?(?:px|em|rem|ex|ch|vw|vh|vmin|vmax|cm|mm|in|pt|pc)\b')
+# a declaration - which, unlike a selector, follows a { or ; and ends with a ; or }.
+DECLARATION_RE = re.compile(r'(?<=[{;])([^:;{}]+):([^;{}]*)(?=[;}])')
+# the properties whose zero lengths keep their units.
+UNITS_KEPT = ('flex', '-webkit-flex', '-ms-flex')
+
+
+def read_statements(fd):
+    """
+    Yields the top level statements of the css read from fd - rules, at-rules with their
+    blocks, and comments - reading it a chunk at a time.
+    """
+    buffer = ''
+    statement = []
+    depth = 0
+    final = False
+    while not final:
+        chunk = fd.read(CHUNK_SIZE)
+        final = not chunk
+        buffer += chunk
+        pos = 0
+        while pos < len(buffer):
+            match = TOKEN_RE.match(buffer, pos)
+            # a token running to the end of the chunk (or a comment not yet closed) may carry
+            # on in the next one.
+            if match is None or not final and (match.end() == len(buffer) or buffer.startswith('/*', pos) and match.group() == '/'):
+                if final:
+                    statement.append(buffer[pos:])
+                    pos = len(buffer)
+                break
+            token = match.group()
+            pos = match.end()
+            statement.append(token)
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            if depth <= 0 and (token in ('}', ';') or token.startswith('/*') and not ''.join(statement[:-1]).strip()):
+                yield ''.join(statement)
+                statement = []
+                depth = 0
+        buffer = buffer[pos:]
+    if statement:
+        yield ''.join(statement)
+
+
+def split_protected(statement):
+    # returns the statement in parts - the odd ones are strings, urls or comments.
+    return PROTECTED_RE.split(statement)
+
+
+def strip_comments(statements):
+    """
+    Removes comments, other than those starting /*! which are kept for licences.
+    """
+    for statement in statements:
+        parts = split_protected(statement)
+        statement = ''.join(part for i, part in enumerate(parts) if not (i % 2 and part.startswith('/*') and not part.startswith('/*!')))
+        if statement.strip():
+            yield statement
+
+
+def strip_zero_units(parts):
+    """
+    Joins the parts of a statement, removing the units of the zero lengths in its declarations.
+    Selectors are left alone, as are custom properties - var() may put their values where a
+    length is needed, eg. calc(var(--gap) + 1px) - and flex, where '1 0px' and '1 0' differ.
+    """
+    def strip(match):
+        prop, value = match.groups()
+        # zero needs its unit inside calc() and the like.
+        if prop.startswith('--') or prop.lower() in UNITS_KEPT or '(' in value and MATH_RE.search(value):
+            return match.group()
+        return '%s:%s' % (prop, ZERO_UNIT_RE.sub('0', value))
+
+    # the strings, urls and comments are taken out while the declarations are found.
+    pieces = DECLARATION_RE.sub(strip, '\0'.join(parts[::2])).split('\0')
+    return ''.join(piece + (parts[i * 2 + 1] if i * 2 + 1 < len(parts) else '') for i, piece in enumerate(pieces))
+
+
+def minify(statements):
+    """
+    Removes unneeded whitespace and semicolons, and the units of zero lengths.
+    """
+    for statement in statements:
+        parts = split_protected(statement)
+        for i in range(0, len(parts), 2):
+            part = re.sub(r'\s+', ' ', parts[i])
+            part = re.sub(r' ?([{};,>]) ?', r'\1', part)
+            part = re.sub(r': ', ':', part)
+            parts[i] = part.replace(';}', '}')
+        statement = strip_zero_units(parts).strip()
+        if statement:
+            yield statement
+
+
+def dedupe_declarations(statement):
+    """
+    Returns the rule with any declaration which is repeated later in its block removed.
+    """
+    parts = split_protected(statement)
+    if statement.lstrip().startswith('@') or sum(part.count('{') for part in parts[::2]) != 1:
+        return statement
+    declarations = ['']
+    for i, part in enumerate(parts):
+        if i % 2:
+            declarations[-1] += part
+        else:
+            pieces = part.split(';')
+            declarations[-1] += pieces[0]
+            declarations.extend(pieces[1:])
+    # the selector and the last declaration share pieces with the braces.
+    head, first = declarations[0].split('{', 1)
+    last, tail = declarations[-1].rsplit('}', 1)
+    declarations[0], declarations[-1] = first, last
+    latest = dict((declaration.strip(), i) for i, declaration in enumerate(declarations) if declaration.strip())
+    kept = [declaration for i, declaration in enumerate(declarations) if not declaration.strip() or latest[declaration.strip()] == i]
+    if len(kept) == len(declarations):
+        return statement
+    return '%s{%s}%s' % (head, ';'.join(kept), tail)
+
+
+def dedupe(statements):
+    """
+    Removes declarations repeated within a rule, and rules repeated later in the css. Only the
+    last copy is kept, so the cascade is unchanged. The css is held in memory (once) to find
+    the later copies.
+    """
+    statements = [dedupe_declarations(statement) for statement in statements]
+    latest = dict((statement.strip(), i) for i, statement in enumerate(statements) if statement.strip().endswith('}'))
+    for i, statement in enumerate(statements):
+        if latest.get(statement.strip(), i) == i:
+            yield statement
+
+
+class Counter(object):
+    """
+    Counts the bytes passing through a stream of statements.
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def count(self, statements):
+        for statement in statements:
+            self.size += len(statement.encode('utf-8'))
+            yield statement
+
+
+def process_file(path, stages):
+    """
+    Runs the css file through the stages, replacing it with the result. The stages are chained
+    generators, so the css is read and written once. Returns a list of (stage name, bytes saved).
+    """
+    tmp = temporary_path(path)
+    with io.open(path, encoding='utf-8', newline='') as source:
+        counters = [Counter()]
+        stream = counters[0].count(read_statements(source))
+        for name, stage in stages:
+            counters.append(Counter())
+            stream = counters[-1].count(stage(stream))
+        with io.open(tmp, 'w', encoding='utf-8', newline='') as fd:
+            for statement in stream:
+                fd.write(statement)
+    os.rename(tmp, path)
+    return [(name, counters[i].size - counters[i + 1].size) for i, (name, stage) in enumerate(stages)]
+
+
+def get_postprocessors():
+    """
+    Returns a (name, callable) for each of the SASS_POSTPROCESSORS.
+    """
+    stages = []
+    for path in SASS_POSTPROCESSORS:
+        try:
+            stages.append((path.rsplit('.', 1)[-1], import_string(path)))
+        except ImportError:
+            raise SassConfigurationError('SASS_POSTPROCESSORS stage could not be imported: %s' % path)
+    return stages
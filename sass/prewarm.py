@@ -0,0 +1,40 @@
+import logging
+import threading
+from multiprocessing import cpu_count
+
+from sass import registry
+from sass.locks import build_lock
+
+
+logger = logging.getLogger(__name__)
+
+
+def prewarm():
+    """
+    Generates the css of every definition which is out of date, then reloads the links. Only
+    the process which gets the build lock generates anything; the others wait for it to finish
+    and pick up its css. Until then the links loaded at startup, to the previous css, are used.
+    """
+    from sass.management.commands import sassify
+
+    try:
+        sassify.Command().process_sass(jobs=cpu_count(), wait=False)
+        # returns once whichever process is generating css has finished.
+        with build_lock():
+            pass
+        registry.load()
+    except Exception:
+        # there is no request to report the failure to - eg. the tables may not exist yet.
+        logger.exception('Unable to prewarm the sass css.')
+
+
+def start_prewarm():
+    """
+    Runs prewarm() in a background thread, so starting the process isn't held up. Returns the
+    thread. It is called by the web server's wsgi.py or asgi.py, so management commands such
+    as migrate and sassify --clean never generate css behind your back.
+    """
+    thread = threading.Thread(target=prewarm, name='sass-prewarm')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,39 @@
+import threading
+
+from sass.manifest import load_manifest
+from sass.definitions import get_bundles, get_definitions
+
+
+LINK_HTML = "<link href='%s' rel='stylesheet' type='text/css' />"
+
+_lock = threading.Lock()
+_links = {}
+
+
+def load():
+    """
+    Builds the link html for every sass definition from the manifest written by the sassify
+    command. It is loaded once, when the app is ready, so rendering a link never needs the
+    database or the filesystem.
+    """
+    manifest = load_manifest()
+    links = {}
+    for definition in get_definitions() + get_bundles():
+        # definitions which have never been generated link to where the css will be.
+        links[definition.name] = LINK_HTML % manifest.get(definition.name, definition.media_url)
+    with _lock:
+        _links.clear()
+        _links.update(links)
+
+
+def get_link(name):
+    if not _links:
+        load()
+    return _links[name]
+
+
+def reset(sender=None, setting=None, **kwargs):
+    # setting_changed receiver - the links are built again when next needed.
+    if setting in (None, 'SASS', 'SASS_BUNDLES', 'SASS_MANIFEST'):
+        with _lock:
+            _links.clear()
@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+
+# Sent with the SassModel, as 'sass_obj', and the reason it is being generated, as 'reason',
+# before its css is generated.
+pre_compile = Signal()
+
+# Sent with the SassModel, as 'sass_obj', once its css has been generated or failed to, with
+# 'error' (None on success) and 'metrics', a dict of compile_time, startup_time, input_size,
+# output_size, cache_hit and reason.
+post_compile = Signal()
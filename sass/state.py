@@ -0,0 +1,258 @@
+import os
+import json
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils.module_loading import import_string
+
+from sass.models import SASS_ROOT, SassModel
+from sass.utils import atomic_write_json
+from sass.dependencies import get_modified_time
+from sass.exceptions import SassConfigurationError, SassLockedError
+
+
+# where the state of the generated css is kept - the dotted path to a store class.
+SASS_STATE_STORE = getattr(settings, 'SASS_STATE_STORE', 'sass.state.ModelStore')
+SASS_STATE_FILE = getattr(settings, 'SASS_STATE_FILE', os.path.join(SASS_ROOT, '.sass-state.json'))
+SASS_STATE_CACHE = getattr(settings, 'SASS_STATE_CACHE', 'default')
+
+# the fields written back after a css file has been generated.
+UPDATE_FIELDS = ['sass_path', 'css_path', 'style', 'source_modified_time', 'dependencies', 'css_hash', 'css_size', 'gzip_size', 'brotli_size',
+                 'input_size', 'compile_time', 'startup_time', 'batch_size', 'cache_hit', 'rebuild_reason']
+
+
+# the row locked by builds with SASS_DB_LOCK - no definition can have an empty name.
+LOCK_NAME = ''
+# the errors databases give when NOWAIT finds a row locked: postgres' lock_not_available, and
+# the codes of oracle's ORA-00054 and mysql's lock wait timeout and ER_LOCK_NOWAIT.
+LOCK_PGCODE = '55P03'
+LOCK_ERROR_CODES = (54, 1205, 3572)
+
+
+def is_lock_error(error):
+    """
+    Returns whether the DatabaseError says another transaction has the rows locked, rather
+    than something being wrong - eg. the table missing.
+    """
+    cause = getattr(error, '__cause__', None) or error
+    if getattr(cause, 'pgcode', None) == LOCK_PGCODE:
+        return True
+    code = cause.args[0] if cause.args else None
+    return getattr(code, 'code', code) in LOCK_ERROR_CODES
+
+
+def to_dict(sass_obj):
+    return dict((field, getattr(sass_obj, field)) for field in ['name'] + UPDATE_FIELDS)
+
+
+def from_dict(fields):
+    sass_obj = SassModel(**fields)
+    sass_obj._state.adding = False
+    return sass_obj
+
+
+class BaseStore(object):
+    """
+    Keeps the SassModels recording what was generated for each definition. Reads and writes
+    are made many at a time, so a build costs one of each whatever the number of files.
+    """
+
+    def create_lock(self):
+        """
+        Makes sure there is something for get_many() to lock. Called before the transaction
+        the build runs in.
+        """
+        pass
+
+    def get_many(self, names, lock=False, nowait=False):
+        """
+        Returns a dict of name to SassModel for the named definitions which have been generated.
+        With lock, stores which can lock the state until the end of the transaction do so -
+        with nowait, raising SassLockedError rather than waiting if another transaction has it.
+        """
+        raise NotImplementedError
+
+    def save_many(self, sass_objs):
+        raise NotImplementedError
+
+    def delete_many(self, names):
+        raise NotImplementedError
+
+    def all(self):
+        """
+        Returns every stored SassModel, including those of definitions since removed.
+        """
+        raise NotImplementedError
+
+
+class ModelStore(BaseStore):
+    """
+    Keeps the state in the database, as SassModel rows.
+    """
+
+    def create_lock(self):
+        # a row of its own, as select_for_update can't lock the rows of definitions which
+        # haven't been generated yet. It is committed straight away, so the builds on other
+        # servers can wait for it.
+        if not SassModel.objects.filter(name=LOCK_NAME).exists():
+            try:
+                with transaction.atomic():
+                    SassModel.objects.bulk_create([SassModel(name=LOCK_NAME)])
+            except IntegrityError:
+                # another server created it first.
+                pass
+
+    def lock(self, nowait=False):
+        # databases without NOWAIT wait for the lock instead.
+        nowait = nowait and connection.features.has_select_for_update_nowait
+        try:
+            list(SassModel.objects.select_for_update(nowait=nowait).filter(name=LOCK_NAME))
+        except DatabaseError as e:
+            if nowait and is_lock_error(e):
+                raise SassLockedError('The sass state is locked by another build.')
+            raise
+
+    def get_many(self, names, lock=False, nowait=False):
+        if lock:
+            # the rows are read once the lock is held, so they include what the build which
+            # held it before wrote.
+            self.lock(nowait)
+        return SassModel.objects.in_bulk(list(names))
+
+    def save_many(self, sass_objs):
+        # the rows are updated in place rather than replaced, so a build waiting on the lock
+        # reads the new state once this transaction commits. Models read from the store are
+        # no longer 'adding', so they are the ones with rows.
+        updated = [sass_obj for sass_obj in sass_objs if not sass_obj._state.adding]
+        created = [sass_obj for sass_obj in sass_objs if sass_obj._state.adding]
+        with transaction.atomic(savepoint=False):
+            if updated and hasattr(SassModel.objects, 'bulk_update'):
+                SassModel.objects.bulk_update(updated, UPDATE_FIELDS)
+            elif updated:
+                self.update_many(updated)
+            if created:
+                SassModel.objects.bulk_create(created)
+        for sass_obj in sass_objs:
+            sass_obj._state.adding = False
+
+    def update_many(self, sass_objs):
+        """
+        Updates the rows of the models with an UPDATE setting each field to a CASE on the name,
+        for versions of django without bulk_update. The models are split into as many
+        statements as the database's limit on parameters needs.
+        """
+        fields = [SassModel._meta.get_field(name) for name in UPDATE_FIELDS]
+        # each model needs its name and value for every field, and its name in the WHERE.
+        size = max(1, connection.ops.bulk_batch_size(['name'] * (2 * len(fields) + 1), sass_objs))
+        for i in range(0, len(sass_objs), size):
+            batch = sass_objs[i:i + size]
+            values = {}
+            for field in fields:
+                whens = [When(name=sass_obj.name, then=Value(getattr(sass_obj, field.attname), output_field=field)) for sass_obj in batch]
+                # the column itself as the default gives the CASE its type, even if every
+                # value is NULL.
+                values[field.attname] = Case(*whens, default=F(field.attname), output_field=field)
+            SassModel.objects.filter(name__in=[sass_obj.name for sass_obj in batch]).update(**values)
+
+    def delete_many(self, names):
+        SassModel.objects.filter(name__in=list(names)).delete()
+
+    def all(self):
+        return list(SassModel.objects.exclude(name=LOCK_NAME))
+
+
+class CacheStore(BaseStore):
+    """
+    Keeps the state in the SASS_STATE_CACHE cache, for sites where generating css shouldn't
+    touch the database. The cache should be a persistent, shared one - eg. redis or memcached
+    rather than the local memory cache.
+    """
+    PREFIX = 'sass:state:'
+    INDEX = 'sass:state'
+
+    def __init__(self):
+        from django.core.cache import caches
+        self.cache = caches[SASS_STATE_CACHE]
+
+    def get_many(self, names, lock=False, nowait=False):
+        found = self.cache.get_many([self.PREFIX + name for name in names])
+        return dict((fields['name'], from_dict(fields)) for fields in found.values())
+
+    def save_many(self, sass_objs):
+        self.cache.set_many(dict((self.PREFIX + sass_obj.name, to_dict(sass_obj)) for sass_obj in sass_objs), None)
+        # a cache can't be listed, so the names stored are kept as well.
+        index = set(self.cache.get(self.INDEX) or ())
+        self.cache.set(self.INDEX, sorted(index | set(sass_obj.name for sass_obj in sass_objs)), None)
+
+    def delete_many(self, names):
+        self.cache.delete_many([self.PREFIX + name for name in names])
+        self.cache.set(self.INDEX, sorted(set(self.cache.get(self.INDEX) or ()) - set(names)), None)
+
+    def all(self):
+        return list(self.get_many(self.cache.get(self.INDEX) or ()).values())
+
+
+class FileStore(BaseStore):
+    """
+    Keeps the state in the SASS_STATE_FILE json file, for machines without a database. The
+    file is only read again when it has changed.
+    """
+
+    def __init__(self, path=SASS_STATE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.state = {}
+
+    def load(self):
+        with self.lock:
+            mtime = get_modified_time(self.path)
+            if mtime != self.mtime:
+                try:
+                    with open(self.path) as fd:
+                        self.state = json.load(fd)
+                except (IOError, OSError, ValueError):
+                    self.state = {}
+                self.mtime = mtime
+            return self.state
+
+    def write(self, state):
+        atomic_write_json(self.path, state, indent=2, sort_keys=True)
+
+    def get_many(self, names, lock=False, nowait=False):
+        state = self.load()
+        return dict((name, from_dict(state[name])) for name in names if name in state)
+
+    def save_many(self, sass_objs):
+        state = dict(self.load())
+        for sass_obj in sass_objs:
+            state[sass_obj.name] = to_dict(sass_obj)
+            sass_obj._state.adding = False
+        self.write(state)
+
+    def delete_many(self, names):
+        state = dict(self.load())
+        for name in names:
+            state.pop(name, None)
+        self.write(state)
+
+    def all(self):
+        return [from_dict(fields) for fields in self.load().values()]
+
+
+_store = None
+
+def get_store():
+    """
+    Returns the store named by the SASS_STATE_STORE setting, kept for the life of the process.
+    """
+    global _store
+    if _store is None:
+        try:
+            store_class = import_string(SASS_STATE_STORE)
+        except ImportError:
+            raise SassConfigurationError('SASS_STATE_STORE could not be imported: %s' % SASS_STATE_STORE)
+        _store = store_class()
+    return _store
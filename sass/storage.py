@@ -0,0 +1,86 @@
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import get_storage_class
+
+from sass.models import SASS_ROOT
+
+
+# the dotted path to a Storage class the generated css is also saved to, eg. one backed by
+# s3, so every server serves the same files. They are saved under their path in SASS_ROOT.
+SASS_STORAGE = getattr(settings, 'SASS_STORAGE', None)
+
+# the fingerprinted copies (and their compressed copies) - a name only ever has one content.
+FINGERPRINTED_RE = re.compile(r'\.[0-9a-f]{12}\.css(\.gz|\.br)?$')
+
+
+_storage = None
+
+def get_storage():
+    """
+    Returns the SASS_STORAGE storage, or None if the css is only kept locally.
+    """
+    global _storage
+    if _storage is None and SASS_STORAGE:
+        _storage = get_storage_class(SASS_STORAGE)()
+    return _storage
+
+
+def storage_name(path):
+    # css generated outside SASS_ROOT is served from its own url, so it has no name in the
+    # storage.
+    if not os.path.abspath(path).startswith(os.path.join(os.path.abspath(SASS_ROOT), '')):
+        return None
+    return os.path.relpath(path, SASS_ROOT).replace(os.path.sep, '/')
+
+
+def is_local(storage, name, path):
+    """
+    Returns whether the storage keeps the named file at the local path - eg. a FileSystemStorage
+    whose location is SASS_ROOT - so it already has the file.
+    """
+    try:
+        return os.path.realpath(storage.path(name)) == os.path.realpath(path)
+    except NotImplementedError:
+        return False
+
+
+def overwrites(storage, name):
+    # storages which overwrite (eg. s3 with AWS_S3_FILE_OVERWRITE) save under the name given
+    # even when it is taken.
+    return storage.get_available_name(name) == name
+
+
+def upload_files(storage, paths, changed=True):
+    """
+    Saves the local files to the storage. Unless they have changed, files the storage already
+    has are left alone, so they aren't uploaded again and keep their modified times. Returns the
+    names saved.
+    """
+    saved = []
+    for path in paths:
+        name = storage_name(path)
+        if name is None or is_local(storage, name, path):
+            continue
+        exists = storage.exists(name)
+        # a fingerprinted copy the storage has already is the same file.
+        if exists and (not changed or FINGERPRINTED_RE.search(name)):
+            continue
+        # the local file is opened first, so it can't be lost if the storage deletes it.
+        with open(path, 'rb') as fd:
+            if exists and not overwrites(storage, name):
+                # other storages save under a new name rather than overwrite, so the file is
+                # missing from the storage until it has been saved again.
+                storage.delete(name)
+            storage.save(name, File(fd))
+        saved.append(name)
+    return saved
+
+
+def delete_files(storage, paths):
+    for path in paths:
+        name = storage_name(path)
+        if name is not None and not is_local(storage, name, path) and storage.exists(name):
+            storage.delete(name)
@@ -1,28 +1,71 @@
+import time
+import threading
+
 from django import template
-from sass.models import SassModel
+from django.conf import settings
+
+from sass import definitions, registry
 from sass.management.commands import sassify
 
 
+# In debug mode the tag checks at render time whether the css needs generating, at most
+# once every SASS_CHECK_INTERVAL seconds per name. Otherwise it never touches the sass files,
+# and the css is expected to have been generated by the sassify command.
+SASS_DEBUG = getattr(settings, 'SASS_DEBUG', settings.DEBUG)
+SASS_CHECK_INTERVAL = getattr(settings, 'SASS_CHECK_INTERVAL', 2)
+
 register = template.Library()
 
+_lock = threading.Lock()
+_last_checked = {}
+
+
+def ensure_fresh(name, members=None):
+    """
+    Generates the css for the named sass (or the members of the named bundle) if it is out of
+    date, unless that was checked less than SASS_CHECK_INTERVAL seconds ago. If another process
+    is already generating css the current css is served rather than waiting for it. The links
+    are reloaded afterwards to pick up css generated by this or any other process.
+    """
+    if not check_due(name):
+        return
+    sassify.Command().process_sass(names=members or [name], wait=False)
+    registry.load()
+
+
+def check_due(name):
+    """
+    Returns whether the named sass is due to be checked, counting it as checked now if so.
+    """
+    now = time.time()
+    with _lock:
+        if now - _last_checked.get(name, 0) < SASS_CHECK_INTERVAL:
+            return False
+        _last_checked[name] = now
+    return True
+
+
 class SassNode(template.Node):
     def __init__(self, name):
-        try:
-            command = sassify.Command()
-            command.process_sass(name=name)
-            self.model = SassModel.objects.get(name=name)
-        except SassModel.DoesNotExist:
-            raise template.TemplateSyntaxError('Sass name "%s" does not exist.' % self.name)
+        if definitions.get_definition(name) is None and SASS_DEBUG:
+            # the sass file may have been added to a directory entry since it was searched.
+            definitions.reset()
+            registry.reset()
+        if definitions.get_definition(name) is None:
+            raise template.TemplateSyntaxError('Sass name "%s" does not exist.' % name)
+        self.name = name
 
 
     def render(self, context):
-        media_url = self.model.css_media_path()
-        css = "<link href='%s?%s' rel='stylesheet' type='text/css' />" %(media_url, self.model.source_modified_time)
-        return css
+        if SASS_DEBUG:
+            ensure_fresh(self.name)
+        return registry.get_link(self.name)
 
 
-@register.tag(name="sass")
-def do_sass(parser, token):
+def parse_name(token):
+    """
+    Returns the quoted name which is the only argument of a tag.
+    """
     try:
         # get the tag and the sass resource.
         tag_name, resource = token.split_contents()
@@ -30,4 +73,27 @@ def do_sass(parser, token):
         raise template.TemplateSyntaxError('%s tag requires a single argument.' %token.contents.split()[0])
     if not (resource[0] == resource[-1] and resource[0] in ('"', "'")):
         raise template.TemplateSyntaxError("%r tag's argument should be in quotes" % tag_name)
-    return SassNode(resource[1:-1])
+    return resource[1:-1]
+
+
+@register.tag(name="sass")
+def do_sass(parser, token):
+    return SassNode(parse_name(token))
+
+
+class SassBundleNode(template.Node):
+    def __init__(self, name):
+        if definitions.get_bundle(name) is None:
+            raise template.TemplateSyntaxError('Sass bundle "%s" does not exist.' % name)
+        self.name = name
+
+
+    def render(self, context):
+        if SASS_DEBUG:
+            ensure_fresh(self.name, definitions.get_bundle(self.name).members)
+        return registry.get_link(self.name)
+
+
+@register.tag(name="sass_bundle")
+def do_sass_bundle(parser, token):
+    return SassBundleNode(parse_name(token))
@@ -5,7 +5,48 @@ unittest). These will both pass when you run "manage.py test".
 Replace these with more appropriate tests for your application.
 """
 
+import io
+import os
+import sys
+import gzip
+import shutil
+import time
+import threading
+import hashlib
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.conf.urls import url
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+from django.template import Context, Template, TemplateSyntaxError
 from django.test import TestCase
+from unittest import skipUnless
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from sass import cache, compilers, compression, definitions, finders, locks, manifest, middleware, models, views
+from sass.exceptions import SassCommandArgumentError, SassConfigurationError, SassException, SassLockedError
+from sass import postprocess, prewarm, registry, signals, storage, utils, watcher
+from sass.templatetags import sass_tag
+from sass.discovery import Discovery
+from sass.models import SassModel
+from sass import state
+from sass.state import CacheStore, FileStore, ModelStore
+from sass.views import etag_matches, serve
+from sass.dependencies import DependencyGraph, parse_imports
+from sass.utils import HASH_CHUNK_SIZE, hash_file, hash_files
+from sass.management.commands import sassify
+
+# the urls used by ServeTest.
+urlpatterns = [
+    url(r'^sass/(?P<path>.*)$', serve),
+    url(r'^media/other\.txt$', lambda request: HttpResponse('other')),
+]
+
+# the stand in for the sass binary used by the benchmarks.
+FAKE_SASS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fakesass')
+# and for the persistent sass worker.
+FAKE_WORKER = os.path.join(os.path.dirname(FAKE_SASS), 'fakeworker')
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -21,3 +62,1213 @@ Another way to test that 1 + 1 is equal to 2.
 True
 """}
 
+
+class DependencyGraphTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.shared = os.path.join(self.root, 'shared')
+        os.mkdir(self.shared)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        with open(path, 'w') as fd:
+            fd.write(content)
+        return path
+
+    def test_parse_imports(self):
+        path = self.write('main.scss', '\n'.join([
+            '@import "reset", \'grid\';',
+            '@use "sass:math";',
+            '@use "theme" as t;',
+            '@forward "mixins" show rounded;',
+            '@import "print.css";',
+            '// @import "commented";',
+            '/* @import "also-commented"; */',
+        ]))
+        self.assertEqual(parse_imports(path), ['reset', 'grid', 'theme', 'mixins'])
+
+    def test_multi_line_imports(self):
+        path = self.write('main.scss', '@import "a",\n  "b";\n@use "c"\n  as c;\n.a { color: red; }')
+        self.assertEqual(parse_imports(path), ['a', 'b', 'c'])
+        # the indented syntax ends a statement with the line.
+        path = self.write('main.sass', '@import a, b\n.a\n  color: red')
+        self.assertEqual(parse_imports(path), ['a', 'b'])
+
+    def test_transitive_dependencies(self):
+        main = self.write('main.scss', '@import "base";')
+        base = self.write('_base.scss', '@use "colors";\n@import "main";')
+        colors = self.write(os.path.join('shared', '_colors.scss'), '$red: #f00;')
+        self.write('other.scss', '@import "colors";')
+
+        graph = DependencyGraph(load_paths=[self.shared])
+        self.assertEqual(graph.dependencies(main), sorted([base, colors]))
+        self.assertEqual(graph.dependencies(os.path.join(self.root, 'other.scss')), [colors])
+
+
+class HashFileTest(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, b'a' * (HASH_CHUNK_SIZE * 2 + 10))
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_matches_md5(self):
+        with open(self.path, 'rb') as fd:
+            expected = hashlib.md5(fd.read()).hexdigest()
+        self.assertEqual(hash_file(self.path), expected)
+        self.assertEqual(hash_files([self.path]), {self.path: expected})
+
+    def test_changed_file_is_rehashed(self):
+        original = hash_file(self.path)
+        with open(self.path, 'ab') as fd:
+            fd.write(b'b')
+        self.assertNotEqual(hash_file(self.path), original)
+
+    def test_uncached(self):
+        self.assertEqual(hash_file(self.path, cache=False), hash_file(self.path))
+        utils._hash_cache.pop(self.path)
+        hash_file(self.path, cache=False)
+        self.assertFalse(self.path in utils._hash_cache)
+
+
+class DefinitionsTest(TestCase):
+    def test_definitions_are_parsed_once(self):
+        sass = ({'name': 'site', 'details': {'input': 'sass/site.scss', 'output': 'css/site.css'}},)
+        with override_settings(SASS=sass):
+            definition = definitions.get_definition('site')
+            self.assertEqual(definition.output_file, os.path.join(definitions.SASS_ROOT, 'css/site.css'))
+            self.assertTrue(definition.media_url.endswith('css/site.css'))
+            self.assertTrue(definitions.get_definition('site') is definition)
+            self.assertEqual(definitions.get_definition('missing'), None)
+
+    def test_invalid_definitions(self):
+        for sass in [
+            ({'name': 'site', 'details': {'input': 'sass/site.scss'}},),
+            ({'name': 'x' * 61, 'details': {'input': 'sass/site.scss', 'output': 'css/site.css'}},),
+            ({'name': 'site', 'details': {'input': 'a.scss', 'output': 'a.css'}},
+             {'name': 'site', 'details': {'input': 'b.scss', 'output': 'b.css'}}),
+        ]:
+            with override_settings(SASS=sass):
+                self.assertRaises(SassConfigurationError, definitions.get_definitions)
+
+    def test_bundles(self):
+        sass = ({'name': 'site', 'details': {'input': 'sass/site.scss', 'output': 'css/site.css'}},)
+        with override_settings(SASS=sass, SASS_BUNDLES=({'name': 'all', 'details': {'members': ['site'], 'output': 'css/all.css'}},)):
+            self.assertEqual(definitions.get_bundle('all').members, ('site',))
+        with override_settings(SASS=sass, SASS_BUNDLES=({'name': 'all', 'details': {'members': ['missing'], 'output': 'css/all.css'}},)):
+            self.assertRaises(SassConfigurationError, definitions.get_bundles)
+
+    def test_reset(self):
+        definitions.get_bundles()
+        definitions.reset()
+        self.assertEqual((definitions._definitions, definitions._bundles, definitions._directories), (None, None, []))
+
+
+class DiscoveryTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'pages/blog'))
+        for name in ['pages/about.scss', 'pages/_partial.scss', 'pages/blog/index.sass', 'pages/notes.txt']:
+            with open(os.path.join(self.root, name), 'w') as fd:
+                fd.write('.a { color: red; }')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_entrypoints(self):
+        discovery = Discovery(os.path.join(self.root, 'cache.json'))
+        pages = os.path.join(self.root, 'pages')
+        self.assertEqual(discovery.entrypoints(pages), ['about.scss', os.path.join('blog', 'index.sass')])
+        discovery.save()
+
+        # the saved listings are used for directories which haven't changed.
+        discovery = Discovery(os.path.join(self.root, 'cache.json'))
+        self.assertEqual(sorted(discovery.cached), [pages, os.path.join(pages, 'blog')])
+        self.assertEqual(discovery.entrypoints(pages), ['about.scss', os.path.join('blog', 'index.sass')])
+
+
+class PostprocessTest(TestCase):
+    CSS = '/* x */\n.a {\n  color: red;\n  margin: 0px;\n  color: red;\n}\n.b { content: "a;b"; width: calc(100% - 0px); }\n.a {\n  color: red;\n  margin: 0px;\n  color: red;\n}\n'
+
+    def run_stages(self, *stages):
+        statements = postprocess.read_statements(io.StringIO(self.CSS))
+        for stage in stages:
+            statements = stage(statements)
+        return ''.join(statements)
+
+    def test_statements(self):
+        self.assertEqual(self.run_stages(), self.CSS)
+        self.assertEqual(len(list(postprocess.read_statements(io.StringIO(self.CSS)))), 5)
+
+    def test_stages(self):
+        self.assertFalse('/*' in self.run_stages(postprocess.strip_comments))
+        self.assertEqual(self.run_stages(postprocess.dedupe).count('color'), 1)
+        self.assertEqual(self.run_stages(postprocess.strip_comments, postprocess.dedupe, postprocess.minify),
+                         '.b{content:"a;b";width:calc(100% - 0px)}.a{margin:0;color:red}')
+
+
+    def test_only_declarations_lose_units(self):
+        # '1 0' would make the flex basis 0%, and selectors match the text as it is.
+        css = '.a { flex: 1 0px; }\n[w=0px] { margin: 0px; }\n@media print { [w=0px], a:not([w=0px]) { margin: 0px 0em; } }\n'
+        statements = postprocess.minify(postprocess.read_statements(io.StringIO(css)))
+        self.assertEqual(''.join(statements), '.a{flex:1 0px}[w=0px]{margin:0}@media print{[w=0px],a:not([w=0px]){margin:0 0}}')
+
+    def test_custom_properties_keep_units(self):
+        # var(--gap) may be used where a length is needed.
+        css = ':root { --gap: 0px; --pad: "a" 0px; margin: 0px; }\n.a { width: calc(var(--gap) + 10px); padding: 0em; }\n'
+        statements = postprocess.minify(postprocess.read_statements(io.StringIO(css)))
+        self.assertEqual(''.join(statements), ':root{--gap:0px;--pad:"a" 0px;margin:0}.a{width:calc(var(--gap) + 10px);padding:0}')
+
+
+class FileStoreTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        store = FileStore(os.path.join(self.root, 'state.json'))
+        store.save_many([SassModel(name='site', sass_path='/sass/site.scss', css_path='/css/site.css', css_hash='abc', css_size=10)])
+        sass_obj = FileStore(store.path).get_many(['site', 'missing'])['site']
+        self.assertEqual((sass_obj.css_path, sass_obj.css_hash, sass_obj.css_size), ('/css/site.css', 'abc', 10))
+        self.assertFalse(sass_obj._state.adding)
+        store.delete_many(['site'])
+        self.assertEqual(FileStore(store.path).all(), [])
+
+
+class CacheStoreTest(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        self.cache = caches[state.SASS_STATE_CACHE]
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+
+    def test_round_trip(self):
+        store = CacheStore()
+        store.save_many([SassModel(name=name, sass_path='/sass/%s.scss' % name, css_path='/css/%s.css' % name, css_hash='abc') for name in ('site', 'print')])
+        sass_objs = CacheStore().get_many(['site', 'missing'])
+        self.assertEqual(list(sass_objs), ['site'])
+        self.assertEqual((sass_objs['site'].css_path, sass_objs['site'].css_hash), ('/css/site.css', 'abc'))
+        self.assertFalse(sass_objs['site']._state.adding)
+        self.assertEqual(sorted(sass_obj.name for sass_obj in store.all()), ['print', 'site'])
+        store.delete_many(['site'])
+        self.assertEqual([sass_obj.name for sass_obj in CacheStore().all()], ['print'])
+
+    def test_store_setting(self):
+        self.addCleanup(setattr, state, '_store', state._store)
+        self.addCleanup(setattr, state, 'SASS_STATE_STORE', state.SASS_STATE_STORE)
+        state._store, state.SASS_STATE_STORE = None, 'sass.state.CacheStore'
+        self.assertTrue(isinstance(state.get_store(), CacheStore))
+        state._store, state.SASS_STATE_STORE = None, 'sass.state.MissingStore'
+        self.assertRaises(SassConfigurationError, state.get_store)
+
+
+class AtomicWriteJsonTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_write(self):
+        path = os.path.join(self.root, 'data.json')
+        utils.atomic_write_json(path, {'b': 1, 'a': [2]}, sort_keys=True)
+        with open(path) as fd:
+            self.assertEqual(fd.read(), '{"a": [2], "b": 1}')
+        # nothing is left behind when the data can't be written.
+        self.assertRaises(TypeError, utils.atomic_write_json, path, {'a': object()})
+        self.assertEqual(os.listdir(self.root), ['data.json'])
+
+
+class UploadFilesTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.sass_root, storage.SASS_ROOT = storage.SASS_ROOT, os.path.join(self.root, 'media')
+        os.makedirs(os.path.join(self.root, 'media/css'))
+        self.path = os.path.join(self.root, 'media/css/site.css')
+        with open(self.path, 'w') as fd:
+            fd.write('.a { color: red; }')
+
+    def tearDown(self):
+        storage.SASS_ROOT = self.sass_root
+        shutil.rmtree(self.root)
+
+    def test_unchanged_files_are_skipped(self):
+        remote = FileSystemStorage(location=os.path.join(self.root, 'remote'))
+        self.assertEqual(storage.upload_files(remote, [self.path]), ['css/site.css'])
+        self.assertEqual(storage.upload_files(remote, [self.path], changed=False), [])
+        self.assertEqual(storage.upload_files(remote, [self.path]), ['css/site.css'])
+        self.assertEqual(remote.listdir('css')[1], ['site.css'])
+
+    def test_overwritten_in_place(self):
+        class OverwritingStorage(FileSystemStorage):
+            # replaces files in place, as s3 does, and records any deleted.
+            deleted = []
+
+            def get_available_name(self, name, max_length=None):
+                return name
+
+            def _save(self, name, content):
+                path = self.path(name)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path + '.tmp', 'wb') as fd:
+                    fd.write(content.read())
+                os.rename(path + '.tmp', path)
+                return name
+
+            def delete(self, name):
+                self.deleted.append(name)
+                super(OverwritingStorage, self).delete(name)
+
+        remote = OverwritingStorage(location=os.path.join(self.root, 'remote'))
+        self.assertEqual(storage.upload_files(remote, [self.path]), ['css/site.css'])
+        with open(self.path, 'w') as fd:
+            fd.write('.a { color: blue; }')
+        # the file is never missing from the storage while it is replaced.
+        self.assertEqual(storage.upload_files(remote, [self.path]), ['css/site.css'])
+        self.assertEqual(remote.deleted, [])
+        with remote.open('css/site.css') as fd:
+            self.assertEqual(fd.read(), b'.a { color: blue; }')
+
+    def test_fingerprinted_copies_are_saved_once(self):
+        remote = FileSystemStorage(location=os.path.join(self.root, 'remote'))
+        path = os.path.join(self.root, 'media/css/site.0123456789ab.css')
+        shutil.copyfile(self.path, path)
+        self.assertEqual(storage.upload_files(remote, [path, self.path]), ['css/site.0123456789ab.css', 'css/site.css'])
+        self.assertEqual(storage.upload_files(remote, [path, self.path]), ['css/site.css'])
+
+    def test_outside_sass_root(self):
+        # the css is served from its own url, so the storage isn't given it.
+        remote = FileSystemStorage(location=os.path.join(self.root, 'remote'))
+        path = os.path.join(self.root, 'cdn/site.css')
+        os.makedirs(os.path.dirname(path))
+        shutil.copyfile(self.path, path)
+        self.assertEqual(storage.upload_files(remote, [path]), [])
+        storage.delete_files(remote, [path])
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'remote')))
+
+    def test_storage_at_sass_root(self):
+        # the storage already holds the generated files, so there is nothing to upload.
+        local = FileSystemStorage(location=os.path.join(self.root, 'media'))
+        self.assertEqual(storage.upload_files(local, [self.path]), [])
+        storage.delete_files(local, [self.path])
+        with open(self.path) as fd:
+            self.assertEqual(fd.read(), '.a { color: red; }')
+
+
+class EtagTest(TestCase):
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"abc"', '"abc"'))
+        self.assertTrue(etag_matches('"abc"', '"x", W/"abc"'))
+        self.assertTrue(etag_matches('"abc"', '*'))
+        self.assertFalse(etag_matches('"abc"', '"abcd"'))
+        self.assertFalse(etag_matches('"abc"', ''))
+
+
+class SassifyTestCase(TestCase):
+    """
+    Runs the sassify command against FAKE_SASS in a temporary SASS_ROOT.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.patch(models, 'SASS_ROOT', self.root)
+        self.patch(definitions, 'SASS_ROOT', self.root)
+        self.patch(storage, 'SASS_ROOT', self.root)
+        self.patch(manifest, 'SASS_MANIFEST', os.path.join(self.root, 'sass-manifest.json'))
+        self.patch(locks, 'SASS_LOCK_FILE', os.path.join(self.root, '.sass.lock'))
+        # the compiler reads SASS_BIN when it is created.
+        self.patch(compilers, '_compiler', None)
+        override = override_settings(SASS_BIN=FAKE_SASS, SASS=())
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.root, 'sass'))
+
+    def patch(self, module, name, value):
+        self.addCleanup(setattr, module, name, getattr(module, name))
+        setattr(module, name, value)
+
+    def define(self, *names):
+        """
+        Writes a sass file for each name and points the SASS setting at them. The css goes to
+        css/<name>.css.
+        """
+        sass = []
+        for name in names:
+            self.write('sass/%s.scss' % name, '.%s { color: red; }\n' % name)
+            sass.append({'name': name, 'details': {'input': 'sass/%s.scss' % name, 'output': 'css/%s.css' % name}})
+        override = override_settings(SASS=tuple(sass))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write(self, path, content):
+        with open(os.path.join(self.root, path), 'w') as fd:
+            fd.write(content)
+
+    def read(self, path):
+        with open(os.path.join(self.root, path)) as fd:
+            return fd.read()
+
+
+class OutputTest(SassifyTestCase):
+    def test_outputs_outside_sass_root_need_a_url(self):
+        # /srv/media-cdn isn't in /srv/media.
+        for output in (self.root + '-cdn/site.css', '../site.css'):
+            self.assertRaises(SassConfigurationError, definitions.get_output, output)
+        self.assertEqual(definitions.get_output(self.root + '-cdn/site.css', 'https://cdn.example.com/site.css'),
+                         (self.root + '-cdn/site.css', 'https://cdn.example.com/site.css'))
+        self.assertEqual(definitions.get_output('css/site.css'), (os.path.join(self.root, 'css/site.css'), models.SASS_URL + 'css/site.css'))
+
+    def test_definitions(self):
+        sass = ({'name': 'site', 'details': {'input': 'sass/site.scss', 'output': '/srv/cdn/site.css'}},)
+        with override_settings(SASS=sass):
+            self.assertRaises(SassConfigurationError, definitions.get_definitions)
+
+
+class ManifestTest(SassifyTestCase):
+    def test_output_outside_sass_root(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        self.write('sass/site.scss', '.site { color: red; }\n')
+        sass = ({'name': 'site', 'details': {'input': 'sass/site.scss', 'output': os.path.join(outside, 'site.css'), 'url': 'https://cdn.example.com/site.css'}},)
+        override = override_settings(SASS=sass)
+        override.enable()
+        self.addCleanup(override.disable)
+        sassify.Command().process_sass()
+        sass_obj = SassModel.objects.get(name='site')
+        self.assertEqual(sass_obj.css_path, os.path.join(outside, 'site.css'))
+        self.assertEqual(manifest.load_manifest(), {'site': 'https://cdn.example.com/site.css?%s' % sass_obj.css_hash[:12]})
+
+    def test_output_outside_sass_root_with_a_storage(self):
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        self.define('print')
+        sass = ({'name': 'site', 'details': {'input': 'sass/print.scss', 'output': os.path.join(outside, 'site.css'), 'url': 'https://cdn.example.com/site.css'}},
+                {'name': 'print', 'details': {'input': 'sass/print.scss', 'output': 'css/print.css'}})
+        override = override_settings(SASS=sass)
+        override.enable()
+        self.addCleanup(override.disable)
+        command = sassify.Command()
+        command.storage = FileSystemStorage(location=os.path.join(self.root, 'remote'))
+        self.assertEqual(sorted(name for name, elapsed in command.process_sass()), ['print', 'site'])
+        self.assertEqual(command.storage.listdir('')[0], ['css'])
+        self.assertEqual(sorted(SassModel.objects.values_list('name', flat=True)), ['print', 'site'])
+        self.assertEqual(sassify.Command().process_sass(), [])
+
+
+class CompilerArgsTest(SassifyTestCase):
+    def test_no_source_maps(self):
+        # a source map would be written next to the temporary file, and left behind.
+        args = compilers.get_compiler().get_args([('a.scss', 'a.css.tmp')], 'nested', [])
+        self.assertTrue('--sourcemap=none' in args)
+        self.assertEqual(args[-2:], ['a.scss', 'a.css.tmp'])
+
+
+class CompilerVersionTest(SassifyTestCase):
+    def test_version_is_the_same_on_every_host(self):
+        # sass installed somewhere else still shares the compile cache.
+        other = os.path.join(self.root, 'bin', 'sass')
+        os.makedirs(os.path.dirname(other))
+        shutil.copy(FAKE_SASS, other)
+        with override_settings(SASS_BIN=other):
+            self.assertEqual(compilers.SubprocessCompiler().version(), 'fakesass 1.0')
+        self.assertEqual(compilers.SubprocessCompiler().version(), 'fakesass 1.0')
+
+
+class BuildLockTest(SassifyTestCase):
+    def test_single_flight(self):
+        self.define('site')
+        # another process is generating css - without waiting, nothing is done.
+        with locks.build_lock() as locked:
+            self.assertTrue(locked)
+            self.assertEqual(sassify.Command().process_sass(wait=False), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/site.css')))
+        self.assertEqual([name for name, elapsed in sassify.Command().process_sass(wait=False)], ['site'])
+
+    def test_locked_by_another_server(self):
+        class LockedStore(ModelStore):
+            # another server's build has the state locked.
+            def lock(self, nowait=False):
+                if nowait:
+                    raise SassLockedError('locked')
+
+        self.define('site')
+        self.patch(sassify, 'SASS_DB_LOCK', True)
+        command = sassify.Command()
+        command.store = LockedStore()
+        self.assertEqual(command.process_sass(wait=False), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/site.css')))
+        self.assertEqual([name for name, elapsed in command.process_sass()], ['site'])
+
+    def test_other_database_errors(self):
+        class BrokenStore(ModelStore):
+            def lock(self, nowait=False):
+                raise DatabaseError('no such table: sass_sassmodel')
+
+        self.define('site')
+        self.patch(sassify, 'SASS_DB_LOCK', True)
+        command = sassify.Command()
+        command.store = BrokenStore()
+        self.assertRaises(DatabaseError, command.process_sass, wait=False)
+
+    def test_lock_row(self):
+        # there is a row to lock before any css has been generated.
+        self.define('site')
+        self.patch(sassify, 'SASS_DB_LOCK', True)
+        sassify.Command().process_sass(wait=False)
+        self.assertTrue(SassModel.objects.filter(name=state.LOCK_NAME).exists())
+        self.assertEqual([sass_obj.name for sass_obj in ModelStore().all()], ['site'])
+        ModelStore().create_lock()
+        self.assertEqual(SassModel.objects.count(), 2)
+
+    def test_lock_errors(self):
+        class PostgresError(Exception):
+            pgcode = '55P03'
+
+        locked = DatabaseError('could not obtain lock on row')
+        locked.__cause__ = PostgresError()
+        self.assertTrue(state.is_lock_error(locked))
+        self.assertTrue(state.is_lock_error(DatabaseError(3572, 'Statement aborted because lock(s) could not be acquired')))
+        self.assertFalse(state.is_lock_error(DatabaseError('no such table: sass_sassmodel')))
+
+    def test_temporary_files(self):
+        self.define('site', 'print')
+        sassify.Command().process_sass()
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'css'))), ['print.css', 'site.css'])
+        self.assertEqual(self.read('css/site.css'), '/* generated */\n.site { color: red; }\n')
+        # regenerating the same css compares the files without remembering the temporary ones.
+        sassify.Command().process_sass(force=True)
+        self.assertEqual([path for path in utils._hash_cache if path.endswith('.tmp')], [])
+
+    def test_failed_output_is_removed(self):
+        self.define('site')
+        sassify.Command().process_sass()
+        command = sassify.Command()
+        sass_obj = SassModel.objects.get(name='site')
+        pairs = command.get_pairs([sass_obj])
+        self.write(pairs[0][1], '.half')
+        self.assertEqual(command.store_output([sass_obj], pairs, 'error', 0, 0), 'error')
+        self.assertFalse(os.path.exists(pairs[0][1]))
+        self.assertEqual(self.read('css/site.css'), '/* generated */\n.site { color: red; }\n')
+
+
+class RecordingCompiler(compilers.BaseCompiler):
+    """
+    Copies each sass file to its css, failing for any named 'broken', and records the sass
+    files of each call.
+    """
+    supports_batch = True
+
+    def __init__(self):
+        self.calls = []
+
+    def compile(self, pairs, style, load_paths):
+        self.calls.append([os.path.basename(input_file) for input_file, output_file in pairs])
+        for input_file, output_file in pairs:
+            if 'broken' in input_file:
+                return 'broken sass', 0
+            shutil.copyfile(input_file, output_file)
+        return None, 0
+
+
+class BatchTest(SassifyTestCase):
+    def test_failed_batch_runs_each_file(self):
+        self.define('a', 'broken', 'b')
+        command = sassify.Command()
+        command.compiler = RecordingCompiler()
+        self.assertRaises(SassException, command.process_sass)
+        # the batch fails, then each file is run on its own so the error is put against it.
+        self.assertEqual(command.compiler.calls, [['a.scss', 'broken.scss', 'b.scss'], ['a.scss'], ['broken.scss'], ['b.scss']])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'css'))), ['a.css', 'b.css'])
+        self.assertEqual(sorted(SassModel.objects.values_list('name', flat=True)), ['a', 'b'])
+
+    def test_batches(self):
+        self.define('a', 'b', 'c')
+        command = sassify.Command()
+        command.compiler = RecordingCompiler()
+        self.assertEqual(len(command.process_sass()), 3)
+        self.assertEqual(command.compiler.calls, [['a.scss', 'b.scss', 'c.scss']])
+
+
+class SassTagTest(SassifyTestCase):
+    def setUp(self):
+        super(SassTagTest, self).setUp()
+        self.define('site')
+        self.patch(sass_tag, '_last_checked', {})
+        self.patch(sass_tag, 'SASS_CHECK_INTERVAL', 0)
+
+    def render(self):
+        return Template("{% load sass_tag %}{% sass 'site' %}").render(Context())
+
+    def link(self):
+        url = '%s?%s' % (definitions.get_definition('site').media_url, SassModel.objects.get(name='site').css_hash[:12])
+        return registry.LINK_HTML % url
+
+    def test_production(self):
+        self.patch(sass_tag, 'SASS_DEBUG', False)
+        registry.load()
+        # css which hasn't been generated is linked to where it will be.
+        self.assertEqual(self.render(), registry.LINK_HTML % definitions.get_definition('site').media_url)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/site.css')))
+
+        sassify.Command().process_sass()
+        registry.load()
+        link = self.link()
+        self.assertEqual(self.render(), link)
+        # the sass files aren't looked at - the links only change when they are loaded again.
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        self.assertEqual(self.render(), link)
+
+    def test_debug(self):
+        self.patch(sass_tag, 'SASS_DEBUG', True)
+        self.assertEqual(self.render(), self.link())
+        link = self.link()
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        self.assertNotEqual(self.render(), link)
+        self.assertEqual(self.render(), self.link())
+        self.assertEqual(self.read('css/site.css'), '/* generated */\n.site { color: blue; }\n')
+
+
+class CompileCacheTest(SassifyTestCase):
+    def setUp(self):
+        super(CompileCacheTest, self).setUp()
+        self.cache_dir = os.path.join(self.root, 'cache')
+        self.patch(cache, 'SASS_ROOT', self.root)
+        self.patch(cache, 'SASS_CACHE_DIR', self.cache_dir)
+
+    def build(self, force=False):
+        command = sassify.Command()
+        command.compiler = RecordingCompiler()
+        command.process_sass(force=force)
+        return command.compiler.calls
+
+    def test_hits_and_misses(self):
+        self.define('site')
+        self.assertEqual(self.build(), [['site.scss']])
+        self.assertFalse(SassModel.objects.get(name='site').cache_hit)
+
+        # a fresh checkout restores the css without running sass.
+        os.remove(os.path.join(self.root, 'css/site.css'))
+        SassModel.objects.all().delete()
+        self.assertEqual(self.build(), [])
+        self.assertTrue(SassModel.objects.get(name='site').cache_hit)
+        self.assertEqual(self.read('css/site.css'), '.site { color: red; }\n')
+
+        # forcing a build always runs sass.
+        self.assertEqual(self.build(force=True), [['site.scss']])
+        self.assertFalse(SassModel.objects.get(name='site').cache_hit)
+
+        # changed sass misses.
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        self.assertEqual(self.build(), [['site.scss']])
+
+    def test_files_are_hashed_once(self):
+        self.define('a', 'b', 'c')
+        self.write('sass/_shared.scss', '$color: red;\n')
+        for name in ('a', 'b', 'c'):
+            self.write('sass/%s.scss' % name, '@import "shared";\n')
+        calls = []
+        def counted_hash_files(paths, jobs=None):
+            calls.append(sorted(os.path.basename(path) for path in paths))
+            return hash_files(paths, jobs)
+        self.patch(sassify, 'hash_files', counted_hash_files)
+        self.patch(cache, 'hash_files', counted_hash_files)
+        self.build()
+        # one pool for the sass files and what they import, and one for the css.
+        self.assertEqual(calls, [['_shared.scss', 'a.scss', 'b.scss', 'c.scss'], ['a.css', 'b.css', 'c.css']])
+        compile_cache = cache.get_cache()
+        path = os.path.join(self.root, 'sass/a.scss')
+        dependencies = [os.path.join(self.root, 'sass/_shared.scss')]
+        self.assertEqual(compile_cache.key(path, dependencies, 'nested', '1'), compile_cache.key(path, dependencies, 'nested', '1', hash_files([path] + dependencies)))
+
+    def test_evict_least_recently_used(self):
+        compile_cache = cache.CompileCache(self.cache_dir, max_size=20)
+        for i, key in enumerate(['aa1', 'bb2', 'cc3']):
+            self.write('css.tmp', '.%s { color: red; }' % key)
+            compile_cache.put(key, os.path.join(self.root, 'css.tmp'))
+            os.utime(compile_cache.path(key), (1000 + i, 1000 + i))
+        # using the oldest entry makes it the most recently used.
+        self.assertTrue(compile_cache.get('aa1', os.path.join(self.root, 'css.out')))
+        compile_cache.evict()
+        self.assertEqual([os.path.exists(compile_cache.path(key)) for key in ['aa1', 'bb2', 'cc3']], [True, False, False])
+        self.assertFalse(compile_cache.get('bb2', os.path.join(self.root, 'css.out')))
+
+
+class PostprocessBuildTest(SassifyTestCase):
+    STAGES = ('sass.postprocess.strip_comments', 'sass.postprocess.dedupe', 'sass.postprocess.minify')
+
+    def setUp(self):
+        super(PostprocessBuildTest, self).setUp()
+        self.patch(cache, 'SASS_ROOT', self.root)
+        self.patch(cache, 'SASS_CACHE_DIR', os.path.join(self.root, 'cache'))
+        self.stages(self.STAGES)
+        self.define('site')
+        self.write('sass/site.scss', ':root { --gap: 0px; }\n.site { margin: 0px; color: red; color: red; }\n')
+
+    def stages(self, stages):
+        self.patch(postprocess, 'SASS_POSTPROCESSORS', stages)
+        self.patch(sassify, 'SASS_POSTPROCESSORS', stages)
+
+    def test_build(self):
+        sent = []
+        def post_compile(sender, sass_obj, error, metrics, **kwargs):
+            sent.append(metrics['postprocess_savings'])
+        signals.post_compile.connect(post_compile)
+        self.addCleanup(signals.post_compile.disconnect, post_compile)
+
+        command = sassify.Command()
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            command.report(command.process_sass())
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        css = ':root{--gap:0px}.site{margin:0;color:red}'
+        self.assertEqual(self.read('css/site.css'), css)
+        savings = command.savings['site']
+        self.assertEqual([stage for stage, saved in savings], ['strip_comments', 'dedupe', 'minify'])
+        self.assertEqual(sum(saved for stage, saved in savings), len('/* generated */\n' + self.read('sass/site.scss')) - len(css))
+        self.assertTrue(all(saved > 0 for stage, saved in savings))
+        self.assertEqual(sent, [savings])
+        self.assertTrue('\tminify saved %d bytes.' % savings[2][1] in output)
+
+    def test_stages_are_in_the_cache_key(self):
+        def build():
+            command = sassify.Command()
+            command.compiler = RecordingCompiler()
+            command.process_sass()
+            SassModel.objects.all().delete()
+            return command.compiler.calls
+
+        self.assertEqual(build(), [['site.scss']])
+        self.assertEqual(build(), [])
+        # css post-processed differently isn't reused.
+        self.stages(self.STAGES[:1])
+        self.assertEqual(build(), [['site.scss']])
+
+
+class SassFinderTest(SassifyTestCase):
+    def setUp(self):
+        super(SassFinderTest, self).setUp()
+        self.patch(finders, 'SASS_ROOT', self.root)
+        self.define('site', 'print')
+
+    def test_find(self):
+        finder = finders.SassFinder()
+        path = os.path.join(self.root, 'css/site.css')
+        self.assertEqual(finder.find('css/site.css'), path)
+        # only the css looked for is generated.
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/print.css')))
+        self.assertEqual(finder.find('css/site.css', all=True), [path])
+        self.assertEqual(finder.find('css/other.css'), [])
+        self.assertEqual(finder.find('sass/site.scss', all=True), [])
+
+    def test_list(self):
+        finder = finders.SassFinder()
+        self.assertEqual([path for path, storage in finder.list([])], ['css/site.css', 'css/print.css'])
+        self.assertEqual([path for path, storage in finder.list(['print.*'])], ['css/site.css'])
+        self.assertEqual(SassModel.objects.count(), 2)
+
+
+@skipUnless(sys.version_info >= (3, 8), 'sass.aio needs python 3.8')
+class AioTest(SassifyTestCase):
+    def setUp(self):
+        super(AioTest, self).setUp()
+        from asgiref.sync import async_to_sync
+        from sass import aio
+        self.aio = aio
+        # the database is used from this thread, as it is by a request.
+        self.run_async = async_to_sync
+        self.define('site', 'print')
+        self.patch(sass_tag, '_last_checked', {})
+
+    def test_acompile(self):
+        timings = self.run_async(self.aio.acompile)()
+        self.assertEqual(sorted(name for name, elapsed in timings), ['print', 'site'])
+        self.assertEqual(self.read('css/site.css'), '/* generated */\n.site { color: red; }\n')
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'css'))), ['print.css', 'site.css'])
+        self.assertEqual(self.run_async(self.aio.acompile)('site'), [])
+
+    def test_aensure_fresh(self):
+        self.run_async(self.aio.aensure_fresh)('site')
+        self.assertEqual(SassModel.objects.get(name='site').rebuild_reason, 'new')
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/print.css')))
+        # checked again only after SASS_CHECK_INTERVAL.
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        self.run_async(self.aio.aensure_fresh)(['site'])
+        self.assertEqual(self.read('css/site.css'), '/* generated */\n.site { color: red; }\n')
+        self.patch(sass_tag, '_last_checked', {})
+        self.run_async(self.aio.aensure_fresh)(['site'])
+        self.assertEqual(self.read('css/site.css'), '/* generated */\n.site { color: blue; }\n')
+
+
+class ModelStoreTest(SassifyTestCase):
+    def test_queries(self):
+        self.define(*['page%d' % i for i in range(10)])
+        sassify.Command().process_sass()
+        sass_objs = list(SassModel.objects.all())
+        for i, sass_obj in enumerate(sass_objs):
+            sass_obj.css_size = i
+            sass_obj.gzip_size = None
+        # a build reads the state once, and writes it with one statement.
+        with self.assertNumQueries(1):
+            ModelStore().save_many(sass_objs)
+        self.assertEqual(sorted(SassModel.objects.values_list('css_size', flat=True)), list(range(10)))
+        self.assertEqual(set(SassModel.objects.values_list('gzip_size', flat=True)), set([None]))
+        with self.assertNumQueries(2):
+            sassify.Command().process_sass(force=True)
+        self.assertEqual(SassModel.objects.count(), 10)
+
+    def test_update_batches(self):
+        # more models than the database takes parameters for in one statement.
+        self.define(*['page%d' % i for i in range(100)])
+        sassify.Command().process_sass()
+        sass_objs = list(SassModel.objects.all())
+        for sass_obj in sass_objs:
+            sass_obj.rebuild_reason = 'updated %s' % sass_obj.name
+        ModelStore().update_many(sass_objs)
+        self.assertEqual(sorted(SassModel.objects.values_list('rebuild_reason', flat=True)), sorted('updated page%d' % i for i in range(100)))
+
+    def test_rows_are_updated_in_place(self):
+        store = ModelStore()
+        store.save_many([SassModel(name='site', sass_path='/sass/site.scss', css_path='/css/site.css', css_hash='abc')])
+        sass_objs = [SassModel(name=name, sass_path='/sass/%s.scss' % name, css_path='/css/%s.css' % name, css_hash='def') for name in ('site', 'print')]
+        # the model for site is built from the stored one, as sassify does.
+        sass_objs[0]._state.adding = False
+        with CaptureQueriesContext(connection) as queries:
+            store.save_many(sass_objs)
+        # the rows another server is waiting to lock are never deleted, so it reads them
+        # again once the build commits rather than finding nothing.
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].upper().startswith('DELETE')])
+        with transaction.atomic():
+            locked = store.get_many(['site', 'print'], lock=True)
+        self.assertEqual(sorted((name, sass_obj.css_hash) for name, sass_obj in locked.items()), [('print', 'def'), ('site', 'def')])
+
+
+class BuildMetricsTest(SassifyTestCase):
+    def setUp(self):
+        super(BuildMetricsTest, self).setUp()
+        self.sent = []
+        signals.pre_compile.connect(self.pre_compile)
+        signals.post_compile.connect(self.post_compile)
+        self.addCleanup(signals.pre_compile.disconnect, self.pre_compile)
+        self.addCleanup(signals.post_compile.disconnect, self.post_compile)
+
+    def pre_compile(self, sender, sass_obj, reason, **kwargs):
+        self.sent.append(('pre_compile', sass_obj.name, reason))
+
+    def post_compile(self, sender, sass_obj, error, metrics, **kwargs):
+        self.sent.append(('post_compile', sass_obj.name, error, metrics))
+
+    def build(self, **kwargs):
+        command = sassify.Command()
+        command.compiler = RecordingCompiler()
+        command.process_sass(**kwargs)
+
+    def stats(self):
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            sassify.Command().stats()
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_signals(self):
+        self.define('a', 'broken')
+        self.assertRaises(SassException, self.build)
+        self.assertEqual([sent[:3] for sent in self.sent if sent[0] == 'pre_compile'], [('pre_compile', 'a', 'new'), ('pre_compile', 'broken', 'new')])
+        post = dict((sent[1], sent) for sent in self.sent if sent[0] == 'post_compile')
+        self.assertEqual(post['broken'][2], 'broken sass')
+        self.assertEqual(post['a'][2], None)
+        metrics = post['a'][3]
+        self.assertEqual((metrics['input_size'], metrics['output_size']), (len('.a { color: red; }\n'), len('.a { color: red; }\n')))
+        self.assertEqual((metrics['reason'], metrics['cache_hit'], metrics['batch_size']), ('new', False, 1))
+        self.assertTrue(metrics['compile_time'] >= 0)
+
+    def test_batched_times_are_marked(self):
+        self.define('a', 'b')
+        self.build()
+        self.assertEqual([sent[3]['batch_size'] for sent in self.sent if sent[0] == 'post_compile'], [2, 2])
+        self.assertEqual(SassModel.objects.get(name='a').batch_size, 2)
+        lines = self.stats().splitlines()
+        self.assertEqual(lines[0].split(), ['name', 'time', 'startup', 'batch', 'input', 'output', 'gzip', 'reason'])
+        self.assertEqual(sorted(line.split()[0] for line in lines[1:3]), ['a', 'b'])
+        self.assertEqual([line.split()[3] for line in lines[1:3]], ['2', '2'])
+        self.assertTrue('split evenly' in lines[4])
+
+        override = override_settings(SASS_BATCH=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.build(force=True)
+        lines = self.stats().splitlines()
+        self.assertEqual([line.split()[3] for line in lines[1:]], ['-', '-'])
+
+
+class CleanTest(SassifyTestCase):
+    def test_removes_earlier_fingerprinted_copies(self):
+        for module in (models, sassify, utils):
+            self.patch(module, 'SASS_FINGERPRINT', True)
+        self.define('site', 'print')
+        sassify.Command().process_sass()
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        sassify.Command().process_sass()
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'css'))), 5)
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            sassify.Command().clean()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(os.listdir(os.path.join(self.root, 'css')), [])
+        self.assertEqual(SassModel.objects.count(), 0)
+        self.assertFalse(os.path.exists(manifest.SASS_MANIFEST))
+
+
+    def test_waits_for_a_build(self):
+        self.define('site')
+        sassify.Command().process_sass()
+        locked = threading.Event()
+        released = []
+
+        def build():
+            # another build (eg. the prewarm) holds the lock for a while.
+            with locks.build_lock():
+                locked.set()
+                time.sleep(0.2)
+                released.append(os.path.exists(os.path.join(self.root, 'css/site.css')))
+
+        thread = threading.Thread(target=build)
+        thread.start()
+        locked.wait(5)
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            sassify.Command().clean()
+        finally:
+            sys.stdout = stdout
+        thread.join(5)
+        # nothing was removed until the build had finished.
+        self.assertEqual(released, [True])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/site.css')))
+
+
+class ServeTest(SassifyTestCase):
+    def setUp(self):
+        super(ServeTest, self).setUp()
+        self.patch(views, 'SASS_ROOT', self.root)
+        self.patch(middleware, 'SASS_URL', '/media/')
+        classes = ['sass.middleware.SassMiddleware']
+        override = override_settings(ROOT_URLCONF='sass.tests', MIDDLEWARE=classes, MIDDLEWARE_CLASSES=classes)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.define('site')
+
+    def test_etags(self):
+        for path in ('/media/css/site.css', '/sass/css/site.css'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'/* generated */\n.site { color: red; }\n')
+            self.assertEqual(response['ETag'], '"%s"' % hashlib.md5(response.content).hexdigest())
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_changed_sass_is_rebuilt(self):
+        etag = self.client.get('/media/css/site.css')['ETag']
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        response = self.client.get('/media/css/site.css', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'/* generated */\n.site { color: blue; }\n')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fingerprinted(self):
+        for module in (models, sassify, utils):
+            self.patch(module, 'SASS_FINGERPRINT', True)
+        sassify.Command().process_sass()
+        path = SassModel.objects.get(name='site').fingerprinted_css_path()
+        response = self.client.get('/media/' + os.path.relpath(path, self.root))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_other_paths_are_passed_on(self):
+        self.assertEqual(self.client.get('/media/other.txt').content, b'other')
+        self.assertEqual(self.client.get('/media/sass/site.scss').status_code, 404)
+        self.assertEqual(self.client.get('/sass/css/other.css').status_code, 404)
+
+
+class BundleTest(SassifyTestCase):
+    def setUp(self):
+        super(BundleTest, self).setUp()
+        self.define('a', 'b')
+        bundles = ({'name': 'all', 'details': {'members': ['b', 'a'], 'output': 'css/all.css'}},)
+        override = override_settings(SASS_BUNDLES=bundles)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def fingerprinted(self):
+        return sorted(name for name in os.listdir(os.path.join(self.root, 'css')) if name.startswith('all.'))
+
+    def test_members_are_joined_in_order(self):
+        sassify.Command().process_sass()
+        css = '/* generated */\n.b { color: red; }\n\n/* generated */\n.a { color: red; }\n\n'
+        self.assertEqual(self.read('css/all.css'), css)
+        fingerprinted = [name for name in self.fingerprinted() if name != 'all.css']
+        self.assertEqual(len(fingerprinted), 1)
+        self.assertEqual(self.read('css/' + fingerprinted[0]), css)
+        self.assertEqual(manifest.load_manifest()['all'], definitions.get_bundle('all').media_url.replace('all.css', fingerprinted[0]))
+
+    def test_rebuilt_when_a_member_changes(self):
+        sassify.Command().process_sass()
+        mtime = os.stat(os.path.join(self.root, 'css/all.css')).st_mtime
+        os.utime(os.path.join(self.root, 'css/all.css'), (mtime - 10, mtime - 10))
+        # regenerating the same css leaves the bundle alone.
+        sassify.Command().process_sass(force=True)
+        self.assertEqual(os.stat(os.path.join(self.root, 'css/all.css')).st_mtime, mtime - 10)
+        self.assertEqual(len(self.fingerprinted()), 2)
+
+        self.write('sass/a.scss', '.a { color: blue; }\n')
+        sassify.Command().process_sass()
+        self.assertTrue('.a { color: blue; }' in self.read('css/all.css'))
+        self.assertEqual(len(self.fingerprinted()), 3)
+
+    def test_tag(self):
+        self.patch(sass_tag, 'SASS_DEBUG', False)
+        sassify.Command().process_sass()
+        registry.load()
+        html = Template("{% load sass_tag %}{% sass_bundle 'all' %}").render(Context())
+        self.assertEqual(html, registry.LINK_HTML % manifest.load_manifest()['all'])
+        for source in ("{% load sass_tag %}{% sass_bundle 'a' %}", "{% load sass_tag %}{% sass_bundle all %}", "{% load sass_tag %}{% sass_bundle %}"):
+            self.assertRaises(TemplateSyntaxError, Template, source)
+
+
+class CompressionTest(SassifyTestCase):
+    def setUp(self):
+        super(CompressionTest, self).setUp()
+        self.patch(compression, 'SASS_GZIP', True)
+        self.patch(sassify, 'SASS_GZIP', True)
+        self.define('site')
+        self.path = os.path.join(self.root, 'css/site.css')
+
+    def test_gzip_is_repeatable(self):
+        sassify.Command().process_sass()
+        with open(self.path + '.gz', 'rb') as fd:
+            data = fd.read()
+        # no timestamp in the header.
+        self.assertEqual(data[4:8], b'\0\0\0\0')
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(data)).read(), b'/* generated */\n.site { color: red; }\n')
+        os.utime(self.path, (1000, 1000))
+        compression.compress_file(self.path)
+        with open(self.path + '.gz', 'rb') as fd:
+            self.assertEqual(fd.read(), data)
+
+    def test_sizes(self):
+        sassify.Command().process_sass()
+        sass_obj = SassModel.objects.get(name='site')
+        self.assertEqual(sass_obj.gzip_size, os.path.getsize(self.path + '.gz'))
+        self.assertEqual(sass_obj.brotli_size, None)
+
+    def test_unchanged_css_isnt_compressed_again(self):
+        sassify.Command().process_sass()
+        os.utime(self.path + '.gz', (1000, 1000))
+        sassify.Command().process_sass(force=True)
+        self.assertEqual(os.stat(self.path + '.gz').st_mtime, 1000)
+        self.write('sass/site.scss', '.site { color: blue; }\n')
+        sassify.Command().process_sass()
+        self.assertNotEqual(os.stat(self.path + '.gz').st_mtime, 1000)
+
+    def test_fingerprinted_copy(self):
+        for module in (models, sassify, utils):
+            self.patch(module, 'SASS_FINGERPRINT', True)
+        sassify.Command().process_sass()
+        path = SassModel.objects.get(name='site').fingerprinted_css_path()
+        with open(path + '.gz', 'rb') as fd, open(self.path + '.gz', 'rb') as original:
+            self.assertEqual(fd.read(), original.read())
+
+
+class PersistentCompilerTest(SassifyTestCase):
+    def setUp(self):
+        super(PersistentCompilerTest, self).setUp()
+        override = override_settings(SASS_WORKER=[sys.executable, FAKE_WORKER], SASS_COMPILER='sass.compilers.PersistentCompiler')
+        override.enable()
+        self.addCleanup(override.disable)
+        self.compiler = compilers.PersistentCompiler()
+        self.addCleanup(self.compiler.close)
+
+    def compile(self, *names):
+        pairs = [(os.path.join(self.root, 'sass/%s.scss' % name), os.path.join(self.root, 'css/%s.css' % name)) for name in names]
+        return self.compiler.compile(pairs, 'nested', [])[0]
+
+    def test_jobs(self):
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.define('a', 'b')
+        self.assertEqual(self.compile('a', 'b'), None)
+        self.assertEqual(self.read('css/b.css'), '/* generated */\n.b { color: red; }\n')
+        # the same worker does every job.
+        pid = self.compiler.process.pid
+        self.assertEqual(self.compile('a'), None)
+        self.assertEqual(self.compiler.process.pid, pid)
+
+    def test_errors(self):
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.define('a', 'broken')
+        self.write('sass/broken.scss', '@error "no";')
+        self.assertEqual(self.compile('a', 'broken'), '%s: @error' % os.path.join(self.root, 'sass/broken.scss'))
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'css/a.css')))
+
+    def test_version(self):
+        # the version comes from the worker, not the command starting it.
+        self.assertEqual(self.compiler.version(), 'fakeworker 1.0')
+        self.define('a')
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.assertEqual(self.compile('a'), None)
+
+    def test_restarted_after_dying(self):
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.define('a', 'crash')
+        self.write('sass/crash.scss', '@exit')
+        self.assertEqual(self.compile('a'), None)
+        pid = self.compiler.process.pid
+        self.assertEqual(self.compile('crash'), 'The sass worker exited unexpectedly.')
+        self.assertEqual(self.compile('a'), None)
+        self.assertNotEqual(self.compiler.process.pid, pid)
+
+    def test_sassify(self):
+        self.define('a', 'b')
+        self.assertTrue(isinstance(compilers.get_compiler(), compilers.PersistentCompiler))
+        self.addCleanup(compilers.get_compiler().close)
+        self.assertEqual(sorted(name for name, elapsed in sassify.Command().process_sass()), ['a', 'b'])
+        self.assertEqual(self.read('css/a.css'), '/* generated */\n.a { color: red; }\n')
+
+
+class CommandArgumentsTest(SassifyTestCase):
+    def test_jobs(self):
+        for jobs in (0, -1):
+            self.assertRaises(SassCommandArgumentError, sassify.Command().handle, jobs=jobs)
+        self.assertRaises(SassCommandArgumentError, sassify.Command().handle, sass_style='pretty')
+
+
+class NoSassBinTest(SassifyTestCase):
+    def test_only_compiling_needs_sass(self):
+        self.define('site')
+        sassify.Command().process_sass()
+        override = override_settings(SASS_BIN=None)
+        override.enable()
+        self.addCleanup(override.disable)
+        compilers._compiler = None
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            sassify.Command().handle(list_sass=True, jobs=1)
+            sassify.Command().handle(stats=True, jobs=1)
+            self.assertEqual(sassify.Command().process_sass(), [])
+            self.write('sass/site.scss', '.site { color: blue; }\n')
+            self.assertRaises(SassConfigurationError, sassify.Command().process_sass)
+            sassify.Command().handle(clean=True, jobs=1)
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(SassModel.objects.count(), 0)
+
+
+class WatchTest(SassifyTestCase):
+    def setUp(self):
+        super(WatchTest, self).setUp()
+        self.define('a', 'b')
+        self.write('sass/_shared.scss', '$color: red;\n')
+        self.write('sass/a.scss', '@import "shared";\n.a { color: $color; }\n')
+        self.path = lambda name: os.path.join(self.root, 'sass', name)
+
+    def test_affected_names(self):
+        command = sassify.Command()
+        watched = command.get_watched_files()
+        self.assertEqual(watched, {self.path('a.scss'): set(['a']), self.path('_shared.scss'): set(['a']), self.path('b.scss'): set(['b'])})
+        self.assertEqual(command.get_affected_names(watched, [self.path('_shared.scss')]), set(['a']))
+        self.assertEqual(command.get_affected_names(watched, [self.path('b.scss'), os.path.join(self.root, 'css/b.css')]), set(['b']))
+        # new sass files, and changes to directories, could affect anything.
+        self.assertEqual(command.get_affected_names(watched, [self.path('_new.scss')]), None)
+        self.assertEqual(command.get_affected_names(watched, [os.path.join(self.root, 'sass')]), None)
+
+    def test_removed_files(self):
+        os.makedirs(os.path.join(self.root, 'sass/pages'))
+        for name in ('a', 'b'):
+            self.write('sass/pages/%s.scss' % name, '@import "../shared";\n')
+        override = override_settings(SASS=({'name': 'pages', 'details': {'input_dir': 'sass/pages', 'output_dir': 'css/pages'}},))
+        override.enable()
+        self.addCleanup(override.disable)
+        command = sassify.Command()
+        command.process_sass()
+        watched = command.get_watched_files()
+        self.assertEqual(watched[self.path('_shared.scss')], set(['pages/a', 'pages/b']))
+        # a removed sass file, or any in a directory entry, means finding the sass files again.
+        os.remove(self.path('pages/b.scss'))
+        self.assertEqual(command.get_affected_names(watched, [self.path('pages/b.scss')]), None)
+        self.assertEqual(command.get_affected_names(watched, [self.path('pages/a.scss')]), None)
+        definitions.reset()
+        self.write('sass/_shared.scss', '$color: blue;\n')
+        self.assertEqual([name for name, elapsed in command.process_sass()], ['pages/a'])
+
+    def test_saved_while_compiling(self):
+        shared = self.path('_shared.scss')
+
+        class SavingCompiler(RecordingCompiler):
+            # the partial is saved again while sass is running.
+            def compile(self, pairs, style, load_paths):
+                result = super(SavingCompiler, self).compile(pairs, style, load_paths)
+                with open(shared, 'w') as fd:
+                    fd.write('$color: blue;\n')
+                mtime = os.stat(shared).st_mtime + 10
+                os.utime(shared, (mtime, mtime))
+                return result
+
+        command = sassify.Command()
+        command.compiler = SavingCompiler()
+        command.process_sass(names=['a'])
+        stale = sassify.Command().get_stale_models(['a'], False)
+        self.assertEqual([sass_obj.rebuild_reason for sass_obj in stale], ['import modified: %s' % shared])
+
+    def test_changes_are_debounced(self):
+        self.patch(watcher, 'SASS_WATCH_DEBOUNCE', 0.3)
+        polling = watcher.PollingWatcher(interval=0.01)
+        polling.watch([self.path('a.scss'), self.path('b.scss'), self.path('_shared.scss')])
+        # a burst of saves is handled as one change.
+        timers = [
+            threading.Timer(0.05, self.write, ['sass/a.scss', '.a { color: blue; }\n']),
+            threading.Timer(0.15, self.write, ['sass/_shared.scss', '$color: blue;\n']),
+        ]
+        for timer in timers:
+            timer.start()
+        try:
+            self.assertEqual(watcher.wait_for_changes(polling), set([self.path('a.scss'), self.path('_shared.scss')]))
+        finally:
+            for timer in timers:
+                timer.cancel()
+        self.assertEqual(polling.wait(0), set())
+
+
+class PrewarmTest(SassifyTestCase):
+    def setUp(self):
+        super(PrewarmTest, self).setUp()
+        self.define('site')
+        self.loaded = threading.Event()
+        self.patch(registry, 'load', self.loaded.set)
+
+    def test_skips_build_while_locked(self):
+        # another process is generating css - prewarm leaves it to them, and waits for them to
+        # finish before reloading the links.
+        with locks.build_lock():
+            thread = prewarm.start_prewarm()
+            self.assertFalse(self.loaded.wait(0.2))
+            self.assertTrue(thread.is_alive())
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(self.loaded.is_set())
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'css/site.css')))
+
+    def test_builds_stale_css(self):
+        prewarm.prewarm()
+        self.assertTrue(self.loaded.is_set())
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'css/site.css')))
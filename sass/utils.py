@@ -1,36 +1,144 @@
 import os
+import json
+import shutil
 import hashlib
+import tempfile
+import threading
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 from django.utils.http import urlquote
 
-from sass.models import SassModel
+from sass.models import SASS_FINGERPRINT, SassModel
+from sass.dependencies import changed_dependencies, stat_modified_time
 from sass.exceptions import SassConfigException
 
-def update_needed(new_sass_model):
-    # check the database and see if the
-    name = new_sass_model.name
-    orig_sass_model = SassModel.objects.get(name=name)
+def update_needed(new_sass_model, orig_sass_model=None):
+    return rebuild_reason(new_sass_model, orig_sass_model) is not None
+
+
+def rebuild_reason(new_sass_model, orig_sass_model=None):
+    """
+    Returns why the css for the model needs to be generated, or None if it is up to date.
+    """
+    # check the stored state and see if the model has changed. Callers which have already
+    # fetched the stored model pass it in to save the query.
+    if orig_sass_model is None:
+        # imported here, as the state store uses these utilities.
+        from sass.state import get_store
+        orig_sass_model = get_store().get_many([new_sass_model.name]).get(new_sass_model.name)
+        if orig_sass_model is None:
+            raise SassModel.DoesNotExist(new_sass_model.name)
 
     # if the output file doesn't exist we need to update
     if not os.path.exists(new_sass_model.css_path):
-        return True
+        return 'css missing'
+
+    # if the fingerprinted copy is missing we need to update.
+    if SASS_FINGERPRINT and not (orig_sass_model.css_hash and os.path.exists(orig_sass_model.fingerprinted_css_path())):
+        return 'fingerprinted css missing'
 
     # if the model has been modified, then we need to update.
     for key in ['sass_path', 'css_path', 'style',]:
         if not getattr(orig_sass_model, key) == getattr(new_sass_model, key):
-            return True
+            return '%s changed' % key
 
     # if the source file has been updated, then we need to update.
     try:
-        last_modified_time = os.stat(new_sass_model.sass_path)[8]
+        last_modified_time = stat_modified_time(os.stat(new_sass_model.sass_path))
         if not str(last_modified_time) == new_sass_model.source_modified_time:
-            return True
+            return 'sass modified'
     except OSError:
         # file does not exist so we need to update
-        return True
+        return 'sass missing'
+
+    # if any of the partials it imports have been updated, then we need to update.
+    changed = changed_dependencies(orig_sass_model)
+    if changed:
+        return 'import modified: %s' % changed[0]
+
+    return None
+
+
+def temporary_path(path):
+    """
+    Returns a path next to the given one, unique to this process and thread, for writing the
+    file before it is renamed into place.
+    """
+    return '%s.%d-%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+
+
+def atomic_copy(source, destination):
+    # the rename means readers see either the old file or all of the new one.
+    tmp = temporary_path(destination)
+    shutil.copyfile(source, tmp)
+    os.rename(tmp, destination)
+
 
-    return False
+def atomic_write_json(path, data, **kwargs):
+    """
+    Writes the data to the json file - to a temporary file first which is renamed over it, so
+    readers never see half of it. Keyword arguments are passed on to json.dump.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as tmp_fd:
+            json.dump(data, tmp_fd, **kwargs)
+        os.chmod(tmp, 0o644)
+        os.rename(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# read files in chunks so hashing a large stylesheet doesn't need it all in memory.
+HASH_CHUNK_SIZE = 64 * 1024
+
+_hash_cache = {}
+_hash_cache_lock = threading.Lock()
+
+def hash_file(filename, cache=True):
+    """
+    Returns the md5 of the file. Hashes are remembered against the device, inode, size and
+    modified time of the file, so a file that hasn't changed is never read twice. Files which
+    are about to be renamed or removed, such as temporary files, should pass cache=False.
+    """
+    try:
+        st = os.stat(filename)
+        key = (st.st_dev, st.st_ino, st.st_size, stat_modified_time(st))
+        with _hash_cache_lock:
+            cached = _hash_cache.get(filename)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        md5 = hashlib.md5()
+        with open(filename, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(HASH_CHUNK_SIZE), b''):
+                md5.update(chunk)
+    except (IOError, OSError) as e:
+        raise SassConfigException(str(e))
+    digest = md5.hexdigest()
+    if cache:
+        with _hash_cache_lock:
+            _hash_cache[filename] = (key, digest)
+    return digest
+
+
+def hash_files(filenames, jobs=None):
+    """
+    Returns a dict of filename to md5 for all the files, hashing them on a pool of threads.
+    """
+    filenames = list(filenames)
+    jobs = min(jobs or cpu_count(), len(filenames))
+    if jobs < 2:
+        return dict((filename, hash_file(filename)) for filename in filenames)
+    pool = ThreadPool(jobs)
+    try:
+        return dict(zip(filenames, pool.map(hash_file, filenames)))
+    finally:
+        pool.close()
+        pool.join()
 
 
 class SassUtils(object):
@@ -46,42 +154,14 @@ class SassUtils(object):
 
     @staticmethod
     def build_sass_structure():
-        sass_definitions = getattr(settings, "SASS", ())
-
-        sass_struct = []
-        for sass_def in sass_definitions:
-            try:
-                sass_name = sass_def.get('name', None)
-                sass_details = sass_def.get('details', {})
-                sass_input = sass_details.get('input', None)
-                sass_output = sass_details.get('output', None)
-
-                # i hate generic exception message - try to give the user a meaningful message about what exactly the problem is.
-                for prop in [('name', sass_name), ('details', sass_details), ('input', sass_input), ('output', sass_output)]:
-                    if not prop[1]:
-                        raise SassConfigException('Sass \'%s\' property not defined in configuration:\n%s\n' %(prop[0], sass_def))
-            except SassConfigException:
-                return
-            sass_input_root = SassUtils.get_file_path(sass_input)
-            sass_output_root = SassUtils.get_file_path(sass_output)
-            sass_output_media = SassUtils.get_media_url(sass_output)
-            sass_struct.append({
-                'name' : sass_name,
-                'input' : sass_input_root,
-                'output' : sass_output_root,
-                'media_out' : sass_output_media,
-            })
-        return sass_struct
+        from sass.definitions import get_definitions
+        return [{
+            'name' : definition.name,
+            'input' : definition.input_file,
+            'output' : definition.output_file,
+            'media_out' : definition.media_url,
+        } for definition in get_definitions()]
 
     @staticmethod
     def md5_file(filename):
-        try:
-            md5 = hashlib.md5()
-            fd = open(filename,"rb")
-            content = fd.readlines()
-            fd.close()
-            for line in content:
-                md5.update(line)
-            return md5.hexdigest()
-        except IOError as e:
-            raise SassConfigException(e.message)
+        return hash_file(filename)
@@ -1 +1,55 @@
-# Create your views here.
+import os
+import re
+
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+
+from sass.models import SASS_ROOT
+from sass.utils import hash_file
+from sass.definitions import get_outputs
+from sass.exceptions import SassException
+
+
+# css/test.<hash>.css -> css/test.css
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{12}(\.[^./]+)$')
+
+
+def etag_matches(etag, header):
+    # If-None-Match uses the weak comparison, so W/ is ignored.
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+
+def serve(request, path):
+    """
+    Serves the css generated for a sass definition or bundle, for development. The css is
+    generated first if its sass has changed, and requests for css the browser already has are
+    answered with 304 Not Modified, using the hash of the css as a strong ETag.
+
+        url(r'^media/(?P<path>.*)$', 'sass.views.serve'),
+    """
+    from sass.management.commands import sassify
+
+    fingerprinted = FINGERPRINT_RE.search(path) is not None
+    names = get_outputs().get(FINGERPRINT_RE.sub(r'\1', path))
+    if names is None:
+        raise Http404('"%s" is not generated by sass.' % path)
+    if not fingerprinted:
+        # a fingerprinted copy never changes - only its current name needs checking.
+        try:
+            sassify.Command().process_sass(names=names)
+        except SassException as e:
+            return HttpResponse(str(e), status=500, content_type='text/plain; charset=utf-8')
+
+    full_path = os.path.join(SASS_ROOT, path)
+    if not os.path.exists(full_path):
+        raise Http404('"%s" does not exist.' % path)
+    etag = '"%s"' % hash_file(full_path)
+    if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        with open(full_path, 'rb') as fd:
+            response = HttpResponse(fd.read(), content_type='text/css; charset=utf-8')
+        response['Content-Length'] = str(len(response.content))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable' if fingerprinted else 'no-cache'
+    return response
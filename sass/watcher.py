@@ -0,0 +1,129 @@
+import os
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+
+from django.conf import settings
+
+from sass.dependencies import get_modified_time
+
+
+# how long the files must be quiet before a burst of saves is rebuilt.
+SASS_WATCH_DEBOUNCE = getattr(settings, 'SASS_WATCH_DEBOUNCE', 0.2)
+# how often the polling watcher looks at the files when inotify isn't available.
+SASS_WATCH_INTERVAL = getattr(settings, 'SASS_WATCH_INTERVAL', 1)
+
+
+class PollingWatcher(object):
+    """
+    Finds changes by comparing the modified times of the watched files and directories. A
+    directory's modified time changes when files are added to or removed from it.
+    """
+
+    def __init__(self, interval=SASS_WATCH_INTERVAL):
+        self.interval = interval
+        self.mtimes = {}
+
+    def watch(self, paths):
+        self.mtimes = dict((path, get_modified_time(path)) for path in paths)
+
+    def wait(self, timeout=None):
+        """
+        Returns the set of watched paths which changed, waiting up to timeout seconds (or
+        forever) for one to. An empty set means nothing changed in time.
+        """
+        start = time.time()
+        while True:
+            changed = set()
+            for path, mtime in self.mtimes.items():
+                current = get_modified_time(path)
+                if current != mtime:
+                    self.mtimes[path] = current
+                    changed.add(path)
+            if changed:
+                return changed
+            if timeout is not None and time.time() - start >= timeout:
+                return changed
+            time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+
+
+class InotifyWatcher(object):
+    """
+    Uses the linux inotify api to be told about changes instead of looking for them. The
+    directories holding the watched files are watched, so replacing a file (as many editors do
+    on save) is seen as well.
+    """
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.directories = {}
+
+    def watch(self, paths):
+        for path in paths:
+            directory = path if os.path.isdir(path) else os.path.dirname(path)
+            if directory in self.directories.values():
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, directory.encode('utf-8'), self.MASK)
+            if wd >= 0:
+                self.directories[wd] = directory
+
+    def wait(self, timeout=None):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            if wd in self.directories:
+                directory = self.directories[wd]
+                changed.add(os.path.join(directory, name) if name else directory)
+        return changed
+
+
+def get_watcher():
+    """
+    Returns an inotify watcher where the platform supports it, and a polling one otherwise.
+    """
+    library = ctypes.util.find_library('c')
+    if library:
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            if hasattr(libc, 'inotify_init1'):
+                return InotifyWatcher(libc)
+        except OSError:
+            pass
+    return PollingWatcher()
+
+
+def wait_for_changes(watcher):
+    """
+    Blocks until a watched path changes, then keeps collecting changes until none have been
+    seen for SASS_WATCH_DEBOUNCE seconds, so a burst of saves is handled as one.
+    """
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(SASS_WATCH_DEBOUNCE)
+        if not more:
+            return changed
+        changed |= more
@@ -0,0 +1,29 @@
+# Sass worker used by sass.compilers.PersistentCompiler.
+#
+# Reads one json job per line from stdin, writes the css to the job's output file and answers
+# with a line of json holding the error message (or null). A {"version": true} job is answered
+# with the version of sass.
+require 'json'
+require 'sass'
+
+STDOUT.sync = true
+
+STDIN.each_line do |line|
+  job = JSON.parse(line)
+  if job['version']
+    puts JSON.generate({'version' => "Sass #{Sass.version[:string]}"})
+    next
+  end
+  begin
+    options = {
+      :style => job['style'].to_sym,
+      :load_paths => job['load_paths'],
+      :cache => false,
+    }
+    css = Sass::Engine.for_file(job['input'], options).render
+    File.open(job['output'], 'w') { |f| f.write(css) }
+    puts JSON.generate({'error' => nil})
+  rescue Exception => e
+    puts JSON.generate({'error' => "#{job['input']}: #{e.message}"})
+  end
+end
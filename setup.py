@@ -9,6 +9,7 @@ setup(
     name='django-sass',
     version='0.1.0',
     packages = find_packages(),
+    package_data = {'sass': ['worker.rb']},
     author='Ash Christopher',
     author_email='ash@newthink.net',
     description='Django library that integrates Sass into your project.',
@@ -16,5 +17,8 @@ setup(
     url='http://github.com/ashchristopher/django-sass',
     keywords='django sass ',
     long_description=read('README'),
-    
+    extras_require = {
+        # sass.aio
+        'async': ['asgiref'],
+    },
 )
\ No newline at end of file